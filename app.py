@@ -1,13 +1,14 @@
-import streamlit as st
-import pandas as pd
-import geopandas as gpd
-import folium
-from streamlit_folium import st_folium
 import os
-import glob
-import zipfile
-import xml.etree.ElementTree as ET
-from folium.features import GeoJsonPopup
+
+import streamlit as st
+
+import telemetry
+import warm_start
+
+# Fast cold start: the heavy modules (pandas, geopandas, pyarrow, folium...)
+# are imported in the background while the page shell and the site selectbox
+# are rendered from the warm-state snapshot; section 6 waits for them.
+warm_start.preload(["site_store", "site_maps", "fichas", "site_views", "streamlit_folium"])
 
 # -----------------------------------------------------------------------------
 # 1. CONFIGURATION
@@ -120,142 +121,42 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# -----------------------------------------------------------------------------
-# 2. HELPER FUNCTIONS
-# -----------------------------------------------------------------------------
-def get_kmz_descriptions(kmz_files):
-    """
-    Parses KMZ files to extract Placemark descriptions (HTML PopupInfo).
-    Returns a dictionary: {Name: Description}
-    """
-    descriptions = {}
-    
-    for kmz_path in kmz_files:
-        if not os.path.exists(kmz_path):
-            continue
-            
-        try:
-            with zipfile.ZipFile(kmz_path, 'r') as kmz:
-                # Find the first kml file
-                kml_filename = [f for f in kmz.namelist() if f.endswith('.kml')][0]
-                with kmz.open(kml_filename, 'r') as kml_file:
-                    tree = ET.parse(kml_file)
-                    root = tree.getroot()
-                    
-                    # Handle namespaced KML (usually http://www.opengis.net/kml/2.2)
-                    # We'll use a wildcard approach for tag names to be robust
-                    # Iterate all elements that end with 'Placemark'
-                    for placemark in root.findall(".//"):
-                        if placemark.tag.endswith('Placemark'):
-                            name_tag = None
-                            desc_tag = None
-                            for child in placemark:
-                                if child.tag.endswith('name'):
-                                    name_tag = child
-                                if child.tag.endswith('description'):
-                                    desc_tag = child
-                            
-                            if name_tag is not None and desc_tag is not None:
-                                name = name_tag.text.strip()
-                                desc = desc_tag.text
-                                descriptions[name] = desc
-                                
-        except Exception as e:
-            # st.warning(f"Error parseando KMZ {kmz_path}: {e}")
-            pass
-            
-    return descriptions
-
 # -----------------------------------------------------------------------------
 # 3. DATA LOADING
 # -----------------------------------------------------------------------------
-@st.cache_data(show_spinner=True)
-def load_data():
+@st.cache_resource(show_spinner=True, max_entries=1)
+def load_data(data_version):
     """
     Loads and processes all necessary data (Originals and Proposed).
-    Handles chunk loading for Proposed sites.
+    Bulk-reads the attribute tables of the prebuilt store (python site_store.py);
+    geometries stay on disk and are read per site in section 7. Only falls back
+    to parsing the chunks, attribute JSONs and KMZs when there is no usable store.
+
+    Cached as a shared resource: one read-only SiteData per process for all
+    sessions. data_version changes with the files on disk, which replaces the
+    cached entry (max_entries=1); load_data.clear() forces a reload.
     """
-    # --- 3.1 Load Originals ---
-    # GeoJSON
-    path_orig_geo = os.path.join("data", "sitios_prior_originales.json")
-    if not os.path.exists(path_orig_geo):
-        st.error(f"Archivo no encontrado: {path_orig_geo}")
-        return None, None
-        
-    gdf_orig = gpd.read_file(path_orig_geo)
-    
-    # Attributes
-    path_orig_attr = os.path.join("data", "sitios_prior_originales (1).json")
-    if os.path.exists(path_orig_attr):
-        df_orig_attr = pd.read_json(path_orig_attr)
-        # Merge on Codrnap
-        if 'Codrnap' in gdf_orig.columns and 'Codrnap' in df_orig_attr.columns:
-            # Only merge columns that are not already in gdf_orig (except key)
-            cols_to_use = df_orig_attr.columns.difference(gdf_orig.columns).tolist()
-            cols_to_use.append('Codrnap')
-            gdf_orig = gdf_orig.merge(df_orig_attr[cols_to_use], on='Codrnap', how='left')
-    else:
-        st.warning("No se encontró el archivo de atributos de Sitios Originales")
-
-    # --- 3.2 Load Proposed (Chunks) ---
-    chunk_files = glob.glob(os.path.join("data", "chunks", "*.geojson"))
-    if not chunk_files:
-        st.error("No se encontraron chunks de datos propuestos en data/chunks/")
-        return gdf_orig, None
-
-    gdf_list = []
-    for file in chunk_files:
-        try:
-            gdf_chunk = gpd.read_file(file)
-            gdf_list.append(gdf_chunk)
-        except Exception as e:
-            st.warning(f"Error cargando chunk {file}: {e}")
-            
-    if gdf_list:
-        gdf_prop = pd.concat(gdf_list, ignore_index=True)
-    else:
-        gdf_prop = gpd.GeoDataFrame()
-        
-    # Attributes Proposed
-    path_prop_attr = os.path.join("data", "sitios_prior_propuestos (1).json")
-    if os.path.exists(path_prop_attr):
-        df_prop_attr = pd.read_json(path_prop_attr)
-        # Merge on Name
-        if 'Name' in gdf_prop.columns and 'Name' in df_prop_attr.columns:
-            # Only merge columns that are not already in gdf_prop (except key)
-            cols_to_use_p = df_prop_attr.columns.difference(gdf_prop.columns).tolist()
-            cols_to_use_p.append('Name')
-            gdf_prop = gdf_prop.merge(df_prop_attr[cols_to_use_p], on='Name', how='left')
-
-    # --- 3.3 Load KMZ Descriptions (PopupInfo recovery) ---
-    kmz_files = [
-        os.path.join("data", "MacroZonaNorte.kmz"),
-        os.path.join("data", "MacroZonaCentro.kmz"),
-        os.path.join("data", "MacroZonaSur.kmz")
-    ]
-    kmz_descriptions = get_kmz_descriptions(kmz_files)
-    
-    # Apply descriptions to gdf_prop
-    if kmz_descriptions:
-        # We assume 'Name' maps to the Placemark name
-        # If 'PopupInfo' exists and is empty/null, we fill it. If it doesn't exist, we create it.
-        if 'PopupInfo' not in gdf_prop.columns:
-            gdf_prop['PopupInfo'] = None
-            
-        # Map values
-        gdf_prop['PopupInfo_KMZ'] = gdf_prop['Name'].map(kmz_descriptions)
-        
-        # Coalesce: Use KMZ if valid, else keep existing
-        gdf_prop['PopupInfo_KMZ'] = gdf_prop['PopupInfo_KMZ'].fillna(gdf_prop['PopupInfo'])
-        gdf_prop['PopupInfo'] = gdf_prop['PopupInfo_KMZ']
-        
-    return gdf_orig, gdf_prop
+    import site_store
+    with telemetry.span("load_data") as sp:
+        site_data = site_store.load_site_data(on_error=st.error, on_warning=st.warning)
+        if site_data is not None:
+            sp.set(rows=len(site_data.prop))
+    return site_data
 
-# Load data
-gdf_orig, gdf_prop = load_data()
 
-if gdf_orig is None or gdf_prop is None:
-    st.stop()
+def get_site_data():
+    """
+    Returns the shared SiteData (see load_data), stopping the page if the data
+    could not be loaded. Waits for the background import of site_store.
+    """
+    import site_store
+    # A stale store is patched first, so the signature already covers the
+    # rewritten store files and load_data runs once per change on disk
+    site_store.refresh_if_stale(on_warning=st.warning)
+    site_data = load_data(site_store.data_signature())
+    if site_data is None:
+        st.stop()
+    return site_data
 
 # -----------------------------------------------------------------------------
 # 4. HEADER & CONTEXT
@@ -281,125 +182,181 @@ with st.expander("ℹ️ Sobre el Proyecto (Contexto)"):
     *   **Detalle de Atributos:** Acceso a la data normativa (Resoluciones, Macro Zonas, Designaciones).
     """)
 
+# Filled in once the data is loaded (section 5)
+overview_slot = st.container()
+
 st.markdown("---")
 
 # -----------------------------------------------------------------------------
 # 5. SITE SELECTION (Top of page)
 # -----------------------------------------------------------------------------
-# Create selection list: "Codrnap (NombreOrig)"
-if 'NombreOrig' in gdf_orig.columns and 'Codrnap' in gdf_orig.columns:
-    gdf_orig['display_name'] = gdf_orig.apply(lambda x: f"{x['Codrnap']} ({x['NombreOrig']})", axis=1)
-    # Sort for better UX
-    options = sorted(gdf_orig['display_name'].tolist())
+# Selection list "Codrnap (NombreOrig)", sorted once at build time: read from the
+# warm-state snapshot, so it renders before any data is loaded. Without a
+# snapshot (no store yet) the data has to be loaded first.
+snapshot = warm_start.read_snapshot()
+if snapshot is not None:
+    site_options = snapshot["options"]
 else:
+    site_data = get_site_data()
+    site_options = site_data.options
+
+if site_options is None:
     st.error("Las columnas 'NombreOrig' o 'Codrnap' no existen en los datos originales.")
     st.stop()
 
-selected_option = st.selectbox("Seleccione Sitio Prioritario:", options)
+selected_option = st.selectbox("Seleccione Sitio Prioritario:", site_options)
 
 # Extract ID (Codrnap) from selection
-# Assuming format "ID (Name)" - split by first space/paren
-selected_id = selected_option.split(' ')[0].strip()
+if snapshot is not None:
+    selected_id = snapshot["ids"][selected_option]
+else:
+    selected_id = site_data.site_id(selected_option)
 
 # Display Selected Site Title
 st.header(f"Sitio: {selected_option}")
 
+# Headline metrics from the snapshot, shown while the maps are loading
+if snapshot is not None:
+    summary = snapshot["metrics"].get(selected_id) or {}
+    facts = []
+    if summary.get('Has_orig') is not None and summary.get('Has_prop') is not None:
+        facts.append(f"Superficie: {summary['Has_orig']:,.2f} → {summary['Has_prop']:,.2f} ha")
+    if summary.get('Perim_km_orig') is not None and summary.get('Perim_km_prop') is not None:
+        facts.append(f"Perímetro: {summary['Perim_km_orig']:,.2f} → {summary['Perim_km_prop']:,.2f} km")
+    if summary.get('iou') is not None:
+        facts.append(f"Superposición (IoU): {summary['iou'] * 100:,.1f} %")
+    if facts:
+        st.caption(" · ".join(facts))
+
 # -----------------------------------------------------------------------------
-# 6. DATA FILTERING
+# 6. SHARED DATA (rest of the page)
 # -----------------------------------------------------------------------------
-# Filter Originals
-site_orig = gdf_orig[gdf_orig['Codrnap'] == selected_id]
+# Heavy imports: already loaded (or loading) in the background by warm_start.preload
+import pandas as pd
+from streamlit_folium import st_folium
+
+import fichas
+import geometry_pyramid
+import site_maps
+import site_store
+import site_views
+
+site_data = get_site_data()
+
+with st.sidebar:
+    if st.button("🔄 Recargar datos"):
+        load_data.clear()
+        st.rerun()
+
+# National overview: sorted, filtered and paginated server-side on the
+# precomputed overview table; only the visible page reaches the browser
+OVERVIEW_SORT_LABELS = {
+    "Δ Superficie (ha)": "delta_has",
+    "|Δ Superficie| (ha)": "abs_delta_has",
+    "Δ Perímetro (km)": "delta_perim_km",
+    "Macro Zona": "FolderPath",
+    "Superposición (IoU)": "iou",
+    "Código": "Codrnap",
+}
+
+with overview_slot:
+    with st.expander("📊 Tabla Nacional de Comparación", expanded=False):
+        t1, t2, t3, t4 = st.columns([2, 1, 2, 2])
+        with t1:
+            sort_label = st.selectbox("Ordenar por", list(OVERVIEW_SORT_LABELS), index=1, key="ov_sort")
+        with t2:
+            ascending = st.toggle("Ascendente", value=False, key="ov_asc")
+        with t3:
+            zones = st.multiselect("Macro Zona", site_data.zones, key="ov_zones")
+        with t4:
+            query = st.text_input("Buscar código o nombre", key="ov_query")
+
+        matching = site_data.overview_query(OVERVIEW_SORT_LABELS[sort_label], ascending, zones, query)
+        page_size = 50
+        n_pages = max(1, -(-len(matching) // page_size))
+        page = st.number_input(f"Página (de {n_pages})", min_value=1, max_value=n_pages, value=1, key="ov_page")
+        page_rows = site_data.overview_rows(matching[(page - 1) * page_size:page * page_size])
+
+        st.caption(f"{len(matching)} sitios")
+        st.dataframe(page_rows, hide_index=True, use_container_width=True)
+
+# National map: the map reports its viewport, the bbox index returns the sites
+# in (a snapped window around) it, and only those are sent, at the pyramid
+# level of the zoom; the base map itself is never redrawn
+with overview_slot:
+    with st.expander("🗺️ Mapa Nacional", expanded=False):
+        if st.toggle("Mostrar mapa nacional", key="ov_map_on"):
+            view_bounds, view_zoom = site_maps.view_from_state(st.session_state.get("ov_map"))
+            query_bounds = site_maps.snap_bounds(view_bounds)
+            view_level = geometry_pyramid.level_for_zoom(view_zoom)
+            in_view = {kind: site_data.in_view(kind, query_bounds) for kind in ('orig', 'prop')}
+            as_points = max(len(rows) for rows in in_view.values()) > site_maps.OVERVIEW_MAX_SITES
+
+            with telemetry.span("overview_view", sites=sum(len(rows) for rows in in_view.values()),
+                                level=view_level, points=as_points):
+                if as_points:
+                    view_features = {kind: site_store.site_points(rows, kind) for kind, rows in in_view.items()}
+                else:
+                    view_features = {kind: site_store.site_geometry(rows, kind, level=view_level)
+                                     for kind, rows in in_view.items()}
+                view_layer = site_maps.overview_layer(
+                    view_features, as_points, cache_key=(site_data.version, query_bounds, view_level, as_points))
+
+            with telemetry.span("overview_map", level=view_level, points=as_points):
+                st_folium(site_maps.overview_base_map(), key="ov_map", height=500, use_container_width=True,
+                          returned_objects=["bounds", "zoom"], feature_group_to_add=view_layer)
+            st.caption(f"{len(in_view['orig'])} sitios originales y {len(in_view['prop'])} propuestos en la vista"
+                       + (" (como puntos: acerque el mapa para ver sus contornos)" if as_points else ""))
+
+# -----------------------------------------------------------------------------
+# 7. DATA FILTERING
+# -----------------------------------------------------------------------------
+# Filter Originals (index lookup, no scan of the frame)
+rows_orig = site_data.rows('orig', selected_id)
 
 # Filter Proposed (using Name as ID as per instructions)
-site_prop = gdf_prop[gdf_prop['Name'] == selected_id]
+rows_prop = site_data.rows('prop', selected_id)
+
+# Proposals with another code overlapping the original (split, merged or
+# recoded sites), from the precomputed spatial matches
+site_matches = site_data.matches('orig', selected_id)
+related_matches = site_matches[site_matches['Name'] != selected_id]
+rows_related = site_data.rows('prop', list(related_matches['Name']))
+
+# Geometry is read on demand for the selected site only, at the pyramid level
+# that matches the extent both maps are fitted to
+map_level = geometry_pyramid.level_for_bounds(site_store.site_bounds(rows_orig, rows_prop, rows_related))
+site_orig = site_store.site_geometry(rows_orig, 'orig', level=map_level)
+site_prop = site_store.site_geometry(rows_prop, 'prop', level=map_level)
+site_related = site_store.site_geometry(rows_related, 'prop', level=map_level)
+
+# Both maps share one layer serialization; rendered HTML is cached per site
+map_cache_key = (selected_id, site_data.version, map_level)
 
 if site_orig.empty:
     st.warning(f"No se encontró información original para el código {selected_id}")
     
 # -----------------------------------------------------------------------------
-# 7. LAYOUT & VISUALIZATION
+# 8. LAYOUT & VISUALIZATION
 # -----------------------------------------------------------------------------
 col1, col2 = st.columns(2)
 
-# --- MAP FUNCTION ---
-def create_dual_map(feature_orig, feature_prop, primary='orig'):
+def render_metric(label, value, unit, delta_val=None):
     """
-    Creates a map with both layers, but sets visibility based on primary.
+    Renders a metric with 50% reduced size and inline delta.
     """
-    # Determine center and bounds from the primary feature found
-    center_geom = None
-    if primary == 'orig' and not feature_orig.empty:
-        center_geom = feature_orig.geometry.iloc[0]
-        bounds = feature_orig.total_bounds
-    elif primary == 'prop' and not feature_prop.empty:
-        center_geom = feature_prop.geometry.iloc[0]
-        bounds = feature_prop.total_bounds
-    
-    # If primary is missing, try the other
-    if center_geom is None:
-        if not feature_orig.empty:
-            center_geom = feature_orig.geometry.iloc[0]
-            bounds = feature_orig.total_bounds
-        elif not feature_prop.empty:
-            center_geom = feature_prop.geometry.iloc[0]
-            bounds = feature_prop.total_bounds
-        else:
-            return None # No geometry at all
-
-    center = center_geom.centroid
-    m = folium.Map(location=[center.y, center.x], zoom_start=10, tiles='Esri.WorldImagery', attr='Esri')
-
-    # Styles
-    style_orig = {'fillColor': '#ff0000', 'color': 'red', 'weight': 2, 'fillOpacity': 0.5}
-    style_prop = {'fillColor': '#00ff00', 'color': 'green', 'weight': 2, 'fillOpacity': 0.5}
-
-    # Add Original Layer
-    if not feature_orig.empty:
-        gj_orig = folium.GeoJson(
-            feature_orig,
-            name='Sitio Original',
-            style_function=lambda x: style_orig,
-            tooltip=folium.GeoJsonTooltip(fields=['NombreOrig'], aliases=['Nombre:']) if 'NombreOrig' in feature_orig.columns else None,
-            show=(primary == 'orig')
-        )
-        gj_orig.add_to(m)
-
-    # Add Proposed Layer
-    if not feature_prop.empty:
-        gj_prop = folium.GeoJson(
-            feature_prop,
-            name='Sitio Propuesto',
-            style_function=lambda x: style_prop,
-             tooltip=folium.GeoJsonTooltip(fields=['Name'], aliases=['Código:']) if 'Name' in feature_prop.columns else None,
-            show=(primary == 'prop')
-        )
-        gj_prop.add_to(m)
-
-    folium.LayerControl().add_to(m)
-    
-    if bounds is not None:
-        m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
-    
-    return m
+    st.markdown(site_views.metric_html(label, value, unit, delta_val), unsafe_allow_html=True)
 
-def render_metric(label, value, unit, delta_val=None):
+
+def render_map(primary):
     """
-    Renders a metric with 50% reduced size and inline delta.
+    Embeds the dual map of the selected site with the given primary layer.
     """
-    delta_html = ""
-    if delta_val is not None:
-        color = "green" if delta_val >= 0 else "red"
-        sign = "+" if delta_val > 0 else ""
-        delta_html = f"<span style='color:{color}; font-size: 0.8em; margin-left: 5px;'>({sign}{delta_val:,.2f})</span>"
-    
-    st.markdown(f"""
-    <div style="margin-bottom: 10px;">
-        <div style="font-size: 0.8rem; color: #888;">{label}</div>
-        <div style="font-size: 1.2rem; font-weight: bold;">
-            {value:,.2f} {unit} {delta_html}
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    map_html = site_maps.dual_map_html(site_orig, site_prop, primary=primary, cache_key=map_cache_key,
+                                       feature_related=site_related)
+    if map_html:
+        with telemetry.span("map_component", primary=primary, bytes=len(map_html)):
+            st.iframe(map_html, height=400)
 
 
 # === COLUMN 1: ORIGINAL ===
@@ -420,9 +377,7 @@ with col1:
             render_metric("Perímetro", perim, "km")
         
         # Map
-        m_orig = create_dual_map(site_orig, site_prop, primary='orig')
-        if m_orig:
-            st_folium(m_orig, use_container_width=True, height=400, key="map_orig")
+        render_map('orig')
             
         # Legend/Color info
         designacion = row['designacio'] if 'designacio' in row else "N/A"
@@ -436,7 +391,7 @@ with col1:
         # Dataframe
         with st.expander("Ver Atributos Detallados", expanded=True):
             # Clean dataframe: drop duplicates columns ending in _attr and geometry
-            cols_to_drop = ['geometry'] + [c for c in site_orig.columns if c.endswith('_attr')]
+            cols_to_drop = ['geometry'] + site_store.INDEX_COLUMNS + [c for c in site_orig.columns if c.endswith('_attr')]
             display_df = pd.DataFrame(site_orig.drop(columns=[c for c in cols_to_drop if c in site_orig.columns]))
             st.dataframe(display_df.T)
     else:
@@ -469,30 +424,81 @@ with col2:
             render_metric("Superficie", has_p, "ha", delta_has)
         with c2b:
             render_metric("Perímetro", perim_p, "km", delta_perim)
+
+        # Geometric comparison vs. original (precomputed when building the store)
+        comparison = site_data.comparison(selected_id)
+        if comparison is not None:
+            c2c, c2d = st.columns(2)
+            with c2c:
+                render_metric("Superposición (IoU)", comparison['iou'] * 100, "%")
+                render_metric("Intersección", comparison['inter_ha'], "ha")
+            with c2d:
+                render_metric("Diferencia simétrica", comparison['symdiff_ha'], "ha")
+                render_metric("Distancia de Hausdorff", comparison['hausdorff_m'], "m")
         
         # Map
-        m_prop = create_dual_map(site_orig, site_prop, primary='prop')
-        if m_prop:
-            st_folium(m_prop, use_container_width=True, height=400, key="map_prop")
+        render_map('prop')
             
         # Legend info
         zona = row_p['FolderPath'] if 'FolderPath' in row_p else "N/A"
         st.caption(f"**Macro Zona / Carpeta:** {zona}")
         
-        # Image Viewer (Ficha)
-        ficha_path = os.path.join("data", "Fichas", f"{selected_id}.jpg")
-        
+        # Image Viewer (Ficha): generated only once asked for (the expander body
+        # runs on every rerun, collapsed or not), screen-sized WebP first and
+        # full resolution on request
         with st.expander("🖼️ Ver Ficha Técnica (Mapa Estático)", expanded=False):
-            if os.path.exists(ficha_path):
-                st.image(ficha_path, caption=f"Ficha: {selected_id}", use_container_width=True)
+            if fichas.ficha_source(selected_id):
+                if st.toggle("Mostrar ficha", key=f"ficha_show_{selected_id}"):
+                    full_res = st.checkbox("Cargar en resolución completa", key=f"ficha_full_{selected_id}")
+                    with telemetry.span("ficha_view", full=full_res) as sp:
+                        ficha_path = fichas.ficha_image(selected_id, "full" if full_res else "screen")
+                        st.image(ficha_path, caption=f"Ficha: {selected_id}", use_container_width=True)
+                        sp.set(bytes=os.path.getsize(ficha_path))
             else:
                 st.warning(f"No se encontró ficha (imagen) para {selected_id}")
                 
-        # PopupInfo Render
+        # PopupInfo Render (fetched from the store only for the selected site)
         with st.expander("Ver Descripción Propuesta (PopupInfo)", expanded=True):
-            if 'PopupInfo' in row_p and row_p['PopupInfo']:
-                 st.markdown(row_p['PopupInfo'], unsafe_allow_html=True)
+            popup_html = site_store.popup_info(row_p)
+            if popup_html:
+                 st.markdown(popup_html, unsafe_allow_html=True)
             else:
                  st.info("Sin información detallada en PopupInfo.")
+    elif not site_related.empty:
+        st.info(f"No hay propuesta con el código {selected_id}, pero {related_matches['Name'].nunique()} "
+                "propuesta(s) se superponen con el sitio original.")
+        render_map('prop')
     else:
         st.warning("No se encontró geometría propuesta para este sitio.")
+
+    # Every proposal overlapping the original, whatever its code
+    if not related_matches.empty:
+        with st.expander("Propuestas relacionadas (superposición espacial)", expanded=site_prop.empty):
+            related_zones = rows_related.drop_duplicates('Name').set_index('Name')['FolderPath'] \
+                if 'FolderPath' in rows_related.columns else pd.Series(dtype=object)
+            related_df = pd.DataFrame({
+                "Código": related_matches['Name'],
+                "Macro Zona": related_matches['Name'].map(related_zones),
+                "Intersección (ha)": related_matches['inter_ha'].round(2),
+                "% del original": (related_matches['share_orig'] * 100).round(1),
+                "% de la propuesta": (related_matches['share_prop'] * 100).round(1),
+            })
+            st.dataframe(related_df, hide_index=True, use_container_width=True)
+
+# -----------------------------------------------------------------------------
+# 9. OPS PANEL (optional: ?admin=1 or MONITOR_ADMIN=1)
+# -----------------------------------------------------------------------------
+# p50/p95 of the timing spans (telemetry.py) of every session of this process
+if st.query_params.get("admin") == "1" or os.environ.get("MONITOR_ADMIN") == "1":
+    with st.sidebar.expander("⏱️ Rendimiento (p50 / p95)", expanded=True):
+        spans = telemetry.summary()
+        if spans:
+            stats = pd.DataFrame(spans).rename(columns={
+                "stage": "Etapa", "count": "n", "p50_ms": "p50 ms", "p95_ms": "p95 ms",
+                "p50_bytes": "p50 bytes", "p95_bytes": "p95 bytes",
+            })
+            st.dataframe(stats, hide_index=True, use_container_width=True)
+        else:
+            st.caption("Sin mediciones todavía.")
+        if st.button("Reiniciar métricas"):
+            telemetry.reset()
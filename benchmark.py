@@ -0,0 +1,346 @@
+"""
+Benchmark suite for the data pipeline and the site view.
+
+For each scale (multiple of the current dataset, see synthetic_data.py) a
+synthetic data directory is generated once and reused, then these stages are
+timed in order:
+
+    split        split_data.split_geojson of the Proposed GeoJSON into chunks
+    kmz          site_store.get_kmz_descriptions (cold, no sidecar cache)
+    load_raw     site_store.load_site_data from the raw sources (no store)
+    build_store  site_store.build_store
+    load_store   site_store.load_site_data from the store (app cold start)
+    filter       site lookup and geometry read for a sample of sites
+    dual_map     site_maps.create_dual_map and its HTML for the same sample
+
+Each stage runs in a fresh process and reports wall time, peak memory (max
+RSS of the process, and its RSS before the stage) and payload bytes (bytes
+written, held in memory or sent to the browser, depending on the stage).
+Results are saved as JSON; given a previous results file with --baseline,
+stages slower than it by more than --tolerance make the run fail, so
+regressions are caught before deploy.
+
+Usage:
+    python benchmark.py [--scales 1 10 100] [--workdir bench_data]
+                        [--output bench_results.json] [--baseline previous.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import synthetic_data
+
+STAGES = ['split', 'kmz', 'load_raw', 'build_store', 'load_store', 'filter', 'dual_map']
+SAMPLE_SITES = 20
+
+# Differences below this many seconds are never reported as regressions
+NOISE_FLOOR_S = 0.05
+
+
+# -----------------------------------------------------------------------------
+# MEASUREMENT
+# -----------------------------------------------------------------------------
+def _rss_mb():
+    # Current RSS (Linux), falling back to the peak so far elsewhere
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return _max_rss_mb()
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Measurement:
+    """
+    Times the body of a `with` block. Stages set payload (bytes) and items
+    (number of sites or files processed) inside the block.
+    """
+
+    def __init__(self):
+        self.wall_s = None
+        self.base_rss_mb = None
+        self.payload = 0
+        self.items = 0
+
+    def __enter__(self):
+        self.base_rss_mb = _rss_mb()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = time.perf_counter() - self._start
+        return False
+
+    def result(self):
+        return {
+            "wall_s": round(self.wall_s, 4),
+            "per_item_ms": round(self.wall_s * 1000 / self.items, 3) if self.items else None,
+            "max_rss_mb": _round(_max_rss_mb()),
+            "base_rss_mb": _round(self.base_rss_mb),
+            "payload_bytes": int(self.payload),
+            "items": self.items,
+        }
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def _frame_bytes(site_data):
+    return sum(int(df.memory_usage(deep=True).sum()) for df in (site_data.orig, site_data.prop))
+
+
+def _sample_ids(site_data, n=SAMPLE_SITES):
+    # Evenly spaced over the selection list, so runs are comparable
+    options = site_data.options or ()
+    step = max(1, len(options) // n)
+    return [site_data.site_id(o) for o in options[::step][:n]]
+
+
+# -----------------------------------------------------------------------------
+# STAGES (each one runs in its own process)
+# -----------------------------------------------------------------------------
+def stage_split(data_dir):
+    from split_data import split_geojson
+
+    chunk_dir = os.path.join(data_dir, "chunks")
+    with Measurement() as m:
+        split_geojson(os.path.join(data_dir, "sitios_prior_propuestos.json"), chunk_dir)
+    m.payload = _dir_size(chunk_dir)
+    m.items = len([f for f in os.listdir(chunk_dir) if f.endswith('.geojson')])
+    return m
+
+
+def stage_kmz(data_dir):
+    import site_store
+
+    kmz_files = [os.path.join(data_dir, f) for f in site_store.KMZ_FILES]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        with Measurement() as m:
+            descriptions = site_store.get_kmz_descriptions(kmz_files, cache_dir=cache_dir)
+    m.payload = sum(len(text.encode('utf-8')) for text in descriptions.values())
+    m.items = len(descriptions)
+    return m
+
+
+def stage_load_raw(data_dir):
+    import site_store
+
+    shutil.rmtree(site_store.store_dir(data_dir), ignore_errors=True)
+    with Measurement() as m:
+        site_data = site_store.load_site_data(data_dir, on_error=print, on_warning=print)
+    m.payload = _frame_bytes(site_data)
+    m.items = len(site_data.prop)
+    return m
+
+
+def stage_build_store(data_dir):
+    import site_store
+
+    with Measurement() as m:
+        site_store.build_store(data_dir)
+    m.payload = _dir_size(site_store.store_dir(data_dir))
+    m.items = len(os.listdir(site_store.store_dir(data_dir)))
+    return m
+
+
+def stage_load_store(data_dir):
+    import site_store
+
+    with Measurement() as m:
+        site_data = site_store.load_site_data(data_dir, on_error=print, on_warning=print)
+    m.payload = _frame_bytes(site_data)
+    m.items = len(site_data.prop)
+    return m
+
+
+def _site_frames(site_store, geometry_pyramid, site_data, site_id, data_dir):
+    rows_orig = site_data.rows('orig', site_id)
+    rows_prop = site_data.rows('prop', site_id)
+    level = geometry_pyramid.level_for_bounds(site_store.site_bounds(rows_orig, rows_prop))
+    site_orig = site_store.site_geometry(rows_orig, 'orig', data_dir, level=level)
+    site_prop = site_store.site_geometry(rows_prop, 'prop', data_dir, level=level)
+    length_col = site_store.index_columns(level)[1]
+    wkb_bytes = sum(int(rows[length_col].sum()) for rows in (rows_orig, rows_prop) if length_col in rows)
+    return site_orig, site_prop, level, wkb_bytes
+
+
+def stage_filter(data_dir):
+    import geometry_pyramid
+    import site_store
+
+    site_data = site_store.load_site_data(data_dir, on_error=print, on_warning=print)
+    ids = _sample_ids(site_data)
+    with Measurement() as m:
+        for site_id in ids:
+            m.payload += _site_frames(site_store, geometry_pyramid, site_data, site_id, data_dir)[3]
+    m.items = len(ids)
+    return m
+
+
+def stage_dual_map(data_dir):
+    import geometry_pyramid
+    import site_maps
+    import site_store
+
+    site_data = site_store.load_site_data(data_dir, on_error=print, on_warning=print)
+    sites = [_site_frames(site_store, geometry_pyramid, site_data, site_id, data_dir)
+             for site_id in _sample_ids(site_data)]
+    with Measurement() as m:
+        for site_orig, site_prop, _, _ in sites:
+            # Both maps of the site view, as sent to the browser (no LRU involved)
+            for primary in ('orig', 'prop'):
+                fmap = site_maps.create_dual_map(site_orig, site_prop, primary=primary)
+                if fmap is not None:
+                    m.payload += len(fmap.get_root().render().encode('utf-8'))
+    m.items = len(sites)
+    return m
+
+
+def _run_stage(name, data_dir):
+    # Child process entry point: stage output (progress prints) is discarded
+    with contextlib.redirect_stdout(io.StringIO()):
+        measurement = globals()[f"stage_{name}"](data_dir)
+    return measurement.result()
+
+
+def run_stage(name, data_dir):
+    """
+    Runs one stage in a fresh process and returns its result dict.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        return pool.submit(_run_stage, name, os.path.abspath(data_dir)).result()
+
+
+# -----------------------------------------------------------------------------
+# DATASETS & REPORT
+# -----------------------------------------------------------------------------
+def prepare_dataset(workdir, scale, seed=0):
+    """
+    Generates (or reuses) the synthetic data directory for a scale.
+    """
+    data_dir = os.path.join(workdir, f"scale_{scale:g}")
+    params = {"scale": scale, "seed": seed, "sites_per_scale": synthetic_data.SITES_PER_SCALE,
+              "median_vertices": synthetic_data.MEDIAN_VERTICES}
+    info_path = os.path.join(data_dir, "dataset.json")
+    try:
+        with open(info_path, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        if info.get("params") == params:
+            return data_dir, info
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(data_dir, ignore_errors=True)
+    print(f"Generating {scale:g}x dataset in {data_dir}...")
+    info = {"params": params, **synthetic_data.generate_dataset(data_dir, scale, seed)}
+    with open(info_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2)
+    return data_dir, info
+
+
+def print_table(scale, dataset, stages):
+    print(f"\n== {scale:g}x: {dataset['sites']} sites, {dataset['bytes'] / (1024 * 1024):.1f} MB of sources ==")
+    print(f"{'stage':<12} {'wall s':>9} {'ms/item':>9} {'max RSS MB':>11} {'base MB':>8} {'payload MB':>11} {'items':>7}")
+    for name, r in stages.items():
+        per_item = f"{r['per_item_ms']:.2f}" if r['per_item_ms'] is not None else '-'
+        max_rss = f"{r['max_rss_mb']:.0f}" if r['max_rss_mb'] is not None else '-'
+        base = f"{r['base_rss_mb']:.0f}" if r['base_rss_mb'] is not None else '-'
+        print(f"{name:<12} {r['wall_s']:>9.3f} {per_item:>9} {max_rss:>11} {base:>8} "
+              f"{r['payload_bytes'] / (1024 * 1024):>11.2f} {r['items']:>7}")
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Returns [(scale, stage, baseline s, current s)] for stages slower than the
+    baseline by more than tolerance (fraction) and NOISE_FLOOR_S.
+    """
+    regressions = []
+    for scale, current in results["scales"].items():
+        previous = baseline.get("scales", {}).get(scale)
+        if previous is None:
+            continue
+        for name, r in current["stages"].items():
+            old = previous["stages"].get(name)
+            if old is None:
+                continue
+            if r["wall_s"] > old["wall_s"] * (1 + tolerance) and r["wall_s"] - old["wall_s"] > NOISE_FLOOR_S:
+                regressions.append((scale, name, old["wall_s"], r["wall_s"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the data pipeline on synthetic datasets.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100],
+                        help="dataset sizes, as multiples of the current one")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--workdir", default="bench_data", help="where the synthetic datasets are kept")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown vs. the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    # Stages depend on the ones before them (chunks, store)
+    stages = [s for s in STAGES if s in args.stages]
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scales": {},
+    }
+    for scale in args.scales:
+        data_dir, dataset = prepare_dataset(args.workdir, scale)
+        timings = {}
+        for name in stages:
+            timings[name] = run_stage(name, data_dir)
+        results["scales"][f"{scale:g}"] = {"dataset": dataset, "stages": timings}
+        print_table(scale, dataset, timings)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for scale, name, old, new in regressions:
+            print(f"REGRESSION {scale}x {name}: {old:.3f}s -> {new:.3f}s")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
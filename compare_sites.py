@@ -0,0 +1,146 @@
+"""
+Batch geometric comparison between original and proposed sites.
+
+For every Codrnap == Name pair computes, with shapely 2 array operations in an
+equal-area projection: intersection area, symmetric-difference area, IoU and
+Hausdorff distance. match_sites also links sites by location rather than by
+code (split, merged or recoded sites). site_store.build_store persists both
+results so the app only looks rows up.
+"""
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# South America Albers Equal Area Conic (areas in m2, distances in m)
+COMPARE_CRS = "ESRI:102033"
+
+# Hausdorff is computed at a step relative to each pair's size: 0.2% of the
+# diagonal of the pair's extent, never below 1 m. Both boundaries are
+# simplified to half a step and sampled every step, so the result is within
+# 1.5 steps of the exact distance and large sites cost no more points than
+# small ones (GEOS compares every point with every edge, O(n * m) per pair)
+HAUSDORFF_RESOLUTION = 0.002
+HAUSDORFF_MIN_STEP_M = 1.0
+
+COLUMNS = ['Codrnap', 'area_orig_ha', 'area_prop_ha', 'inter_ha', 'symdiff_ha', 'iou', 'hausdorff_m']
+
+MATCH_COLUMNS = ['Codrnap', 'Name', 'inter_ha', 'share_orig', 'share_prop']
+
+# Overlaps below this share of both sites' areas are digitizing slivers
+# between neighbours, not related sites
+MIN_MATCH_SHARE = 0.001
+
+
+def _projected(geometries, crs):
+    # Plain object arrays: shapely ufuncs on GeometryArray go through pandas dispatch.
+    # Validated again after projecting: dense rings can self-touch once reprojected
+    series = gpd.GeoSeries(shapely.make_valid(np.asarray(geometries, dtype=object)), crs=crs)
+    return shapely.make_valid(np.asarray(series.to_crs(COMPARE_CRS).values, dtype=object))
+
+
+def _hausdorff_steps(a, b):
+    # Per pair: HAUSDORFF_RESOLUTION of the diagonal of both geometries' bounds
+    ba, bb = shapely.bounds(a), shapely.bounds(b)
+    with np.errstate(invalid='ignore'):
+        width = np.fmax(ba[:, 2], bb[:, 2]) - np.fmin(ba[:, 0], bb[:, 0])
+        height = np.fmax(ba[:, 3], bb[:, 3]) - np.fmin(ba[:, 1], bb[:, 1])
+    steps = np.fmax(np.hypot(width, height) * HAUSDORFF_RESOLUTION, HAUSDORFF_MIN_STEP_M)
+    # Missing geometries: any step, the distance comes out NaN
+    return np.where(np.isfinite(steps), steps, HAUSDORFF_MIN_STEP_M)
+
+
+def hausdorff_distances(a, b):
+    """
+    Hausdorff distance (m) between the boundaries of each pair of projected
+    geometries a[i], b[i], in one GEOS call over the arrays. Both sides are
+    simplified and densified to a step adapted to each pair's extent (see
+    HAUSDORFF_RESOLUTION). NaN where either geometry is missing or empty.
+    """
+    a = np.asarray(a, dtype=object)
+    b = np.asarray(b, dtype=object)
+    steps = _hausdorff_steps(a, b)
+    sa = shapely.segmentize(shapely.simplify(a, steps / 2), steps)
+    sb = shapely.segmentize(shapely.simplify(b, steps / 2), steps)
+    distances = shapely.hausdorff_distance(sa, sb)
+    empty = shapely.is_empty(a) | shapely.is_empty(b)
+    return np.where(empty, np.nan, distances)
+
+
+def compare_sites(gdf_orig, gdf_prop):
+    """
+    Returns one row per original/proposed pair (see COLUMNS).
+    Pairs where either geometry is missing get NaN metrics.
+    """
+    left = gdf_orig[['Codrnap', 'geometry']].dropna(subset=['Codrnap'])
+    right = gdf_prop[['Name', 'geometry']].dropna(subset=['Name'])
+    pairs = left.merge(right, left_on='Codrnap', right_on='Name', suffixes=('_orig', '_prop'))
+    if pairs.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    a = _projected(pairs['geometry_orig'].values, gdf_orig.crs)
+    b = _projected(pairs['geometry_prop'].values, gdf_prop.crs)
+
+    area_a = shapely.area(a)
+    area_b = shapely.area(b)
+    inter = shapely.area(shapely.intersection(a, b))
+    union = area_a + area_b - inter
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        iou = np.where(union > 0, inter / union, np.nan)
+
+    hausdorff = hausdorff_distances(a, b)
+
+    return pd.DataFrame({
+        'Codrnap': pairs['Codrnap'].values,
+        'area_orig_ha': area_a / 10000,
+        'area_prop_ha': area_b / 10000,
+        'inter_ha': inter / 10000,
+        # |A ^ B| = |A| + |B| - 2 |A n B|, no need to build the geometry
+        'symdiff_ha': (area_a + area_b - 2 * inter) / 10000,
+        'iou': iou,
+        'hausdorff_m': hausdorff,
+    }, columns=COLUMNS)
+
+
+def match_sites(gdf_orig, gdf_prop, min_share=MIN_MATCH_SHARE):
+    """
+    Many-to-many spatial match: one row per (Codrnap, Name) pair whose
+    polygons overlap (see MATCH_COLUMNS), whatever their codes. Candidate
+    pairs come from an STRtree over the proposals, O(n log n) instead of
+    testing every pair. share_orig / share_prop are the overlap as a fraction
+    of each site's area; pairs that only touch, or overlap less than
+    min_share of both sites, are left out.
+    """
+    left = gdf_orig[['Codrnap', 'geometry']].dropna()
+    right = gdf_prop[['Name', 'geometry']].dropna()
+    if left.empty or right.empty:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    a = _projected(left['geometry'].values, gdf_orig.crs)
+    b = _projected(right['geometry'].values, gdf_prop.crs)
+    ia, ib = shapely.STRtree(b).query(a, predicate='intersects')
+
+    pairs = pd.DataFrame({
+        'Codrnap': left['Codrnap'].values[ia],
+        'Name': right['Name'].values[ib],
+        'inter': shapely.area(shapely.intersection(a[ia], b[ib])),
+    })
+    # Sites can span several rows: overlaps and areas are summed per site
+    pairs = pairs.groupby(['Codrnap', 'Name'], as_index=False, sort=False)['inter'].sum()
+    area_orig = pd.Series(shapely.area(a)).groupby(left['Codrnap'].values).sum()
+    area_prop = pd.Series(shapely.area(b)).groupby(right['Name'].values).sum()
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share_orig = pairs['inter'].values / pairs['Codrnap'].map(area_orig).values
+        share_prop = pairs['inter'].values / pairs['Name'].map(area_prop).values
+
+    matches = pd.DataFrame({
+        'Codrnap': pairs['Codrnap'].values,
+        'Name': pairs['Name'].values,
+        'inter_ha': pairs['inter'].values / 10000,
+        'share_orig': share_orig,
+        'share_prop': share_prop,
+    }, columns=MATCH_COLUMNS)
+    keep = (matches['share_orig'] >= min_share) | (matches['share_prop'] >= min_share)
+    return matches[keep].sort_values(['Codrnap', 'inter_ha'], ascending=[True, False], ignore_index=True)
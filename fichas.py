@@ -0,0 +1,126 @@
+"""
+Derivative image cache for the Fichas (technical sheets, data/Fichas/<Codrnap>.jpg).
+
+Derivatives are WebP files generated lazily on first request and kept in a
+size-bounded LRU directory: every hit refreshes the file's mtime and the
+least recently used files are evicted once the cache grows past its limit.
+"""
+import os
+
+from PIL import Image
+
+import telemetry
+from warm_start import DATA_DIR, STORE_DIRNAME, file_sha1
+
+
+def ficha_dirs(data_dir=DATA_DIR):
+    """
+    (original JPEGs, derivative cache) directories of a data directory.
+    """
+    return os.path.join(data_dir, "Fichas"), os.path.join(data_dir, STORE_DIRNAME, "fichas")
+
+
+FICHAS_DIR, CACHE_DIR = ficha_dirs(DATA_DIR)
+CACHE_LIMIT_MB = 150
+
+# Longest side in px (None keeps the original resolution) and WebP quality
+SIZES = {
+    "thumb": (320, 70),
+    "screen": (1280, 80),
+    "full": (None, 85),
+}
+
+
+def ficha_source(site_id, fichas_dir=FICHAS_DIR):
+    """
+    Path of the original JPEG for a site, or None if there is no ficha.
+    """
+    path = os.path.join(fichas_dir, f"{site_id}.jpg")
+    return path if os.path.exists(path) else None
+
+
+# {source path: (size, mtime_ns, sha1)}, so a view re-hashes a JPEG only
+# after it changes on disk
+_source_hashes = {}
+
+
+def _source_digest(source):
+    stat = os.stat(source)
+    cached = _source_hashes.get(source)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    digest = file_sha1(source)[:12]
+    _source_hashes[source] = (stat.st_size, stat.st_mtime_ns, digest)
+    return digest
+
+
+def _cache_usage(cache_dir):
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith('.webp') and os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def evict(cache_dir=CACHE_DIR, limit_mb=CACHE_LIMIT_MB):
+    """
+    Deletes least recently used derivatives until the cache fits in limit_mb.
+    """
+    entries = sorted(_cache_usage(cache_dir))
+    total = sum(size for _, size, _ in entries)
+    limit = limit_mb * 1024 * 1024
+    for _, size, path in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _generate(source, target, size):
+    max_side, quality = SIZES[size]
+    with Image.open(source) as im:
+        im = im.convert('RGB')
+        if max_side is not None:
+            im.thumbnail((max_side, max_side), Image.LANCZOS)
+        tmp = target + '.tmp'
+        im.save(tmp, 'WEBP', quality=quality, method=4)
+    os.replace(tmp, target)
+
+
+def ficha_image(site_id, size="screen", fichas_dir=FICHAS_DIR, cache_dir=CACHE_DIR,
+                limit_mb=CACHE_LIMIT_MB):
+    """
+    Returns the path of the requested derivative ('thumb', 'screen' or 'full'),
+    generating it if needed. Derivatives are keyed by the source's hash
+    (recomputed only when its size or mtime change), so a replaced JPEG never
+    serves a stale image. Falls back to the original JPEG
+    if the derivative cannot be written; None if the site has no ficha.
+    """
+    source = ficha_source(site_id, fichas_dir)
+    if source is None:
+        return None
+
+    with telemetry.span("ficha_image", size=size) as sp:
+        target = os.path.join(cache_dir, f"{site_id}_{_source_digest(source)}_{size}.webp")
+        if os.path.exists(target):
+            try:
+                os.utime(target)  # LRU: mark as recently used
+            except OSError:
+                pass
+            sp.set(hit=True, bytes=os.path.getsize(target))
+            return target
+
+        sp.set(hit=False)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            _generate(source, target, size)
+            evict(cache_dir, limit_mb)
+        except OSError:
+            return source
+        sp.set(bytes=os.path.getsize(target))
+        return target
@@ -0,0 +1,64 @@
+"""
+Multi-resolution geometry pyramid for the site maps.
+
+Each site is precomputed at several topology-preserving simplification levels,
+with coordinates snapped to a grid suited to that level. The map then picks the
+coarsest level that still looks exact at the zoom it is displayed at.
+"""
+import math
+
+import shapely
+
+# Level 0 is the full-precision geometry. Levels 1..n: (tolerance, grid size) in degrees
+# (1e-5 deg is roughly 1 m at Chilean latitudes).
+LEVELS = {
+    1: (0.00001, 0.000001),
+    2: (0.0001, 0.00001),
+    3: (0.0005, 0.00001),
+    4: (0.002, 0.0001),
+}
+
+# Default size of the folium maps in app.py (half of a wide layout)
+MAP_WIDTH_PX = 700
+MAP_HEIGHT_PX = 400
+
+
+def simplify(geometries, level):
+    """
+    Returns the geometries (shapely array or scalar) at the given pyramid level.
+    """
+    if level == 0:
+        return geometries
+    tolerance, grid_size = LEVELS[level]
+    simplified = shapely.simplify(geometries, tolerance, preserve_topology=True)
+    return shapely.set_precision(simplified, grid_size)
+
+
+def level_for_resolution(deg_per_px):
+    """
+    Coarsest level whose simplification tolerance stays below one screen pixel.
+    """
+    best = min(LEVELS)
+    for level, (tolerance, _) in sorted(LEVELS.items()):
+        if tolerance <= deg_per_px:
+            best = level
+    return best
+
+
+def level_for_zoom(zoom):
+    """
+    Pyramid level for a web-mercator zoom level (256 px tiles).
+    """
+    return level_for_resolution(360.0 / (256 * 2 ** zoom))
+
+
+def level_for_bounds(bounds, width_px=MAP_WIDTH_PX, height_px=MAP_HEIGHT_PX, zoom_in=1):
+    """
+    Pyramid level for a map fitted to bounds (minx, miny, maxx, maxy).
+    zoom_in keeps the level exact for that many zoom steps past the fitted view.
+    """
+    if bounds is None or any(math.isnan(b) for b in bounds):
+        return min(LEVELS)
+    minx, miny, maxx, maxy = bounds
+    deg_per_px = max((maxx - minx) / width_px, (maxy - miny) / height_px)
+    return level_for_resolution(deg_per_px / 2 ** zoom_in)
@@ -0,0 +1,214 @@
+"""
+Compact wire encoding of the site map layers (TopoJSON-like).
+
+All layers of a map are encoded together: coordinates are quantized to an
+integer grid, rings are cut into arcs at the points where boundaries meet or
+part, and every arc is stored once, delta-encoded, however many rings use it
+(an edge shared by the original and proposed boundaries is sent once, and a
+ring identical in both layers becomes a single arc). Features keep only
+arc references. DECODER_JS rebuilds the GeoJSON in the browser.
+"""
+import json
+
+import numpy as np
+import shapely
+
+# Grid step in degrees (~0.1 m), the finest grid of the geometry pyramid
+QUANTUM = 0.000001
+
+# Point keys pack the quantized (x, y) into one int
+_SHIFT = 32
+_MASK = (1 << _SHIFT) - 1
+
+# Defines window.decodeSiteTopology(topology) once per page; the result's
+# layer(name) returns that layer as a GeoJSON FeatureCollection
+DECODER_JS = """
+window.decodeSiteTopology = window.decodeSiteTopology || function(topo) {
+    var sx = topo.scale, tx = topo.translate;
+    var arcs = topo.arcs.map(function(a) {
+        var x = 0, y = 0, pts = [];
+        for (var i = 0; i < a.length; i += 2) {
+            x += a[i]; y += a[i + 1];
+            pts.push([x * sx + tx[0], y * sx + tx[1]]);
+        }
+        return pts;
+    });
+    function ring(refs) {
+        var out = [];
+        refs.forEach(function(r) {
+            var pts = r < 0 ? arcs[~r].slice().reverse() : arcs[r];
+            // Consecutive arcs share their end point
+            Array.prototype.push.apply(out, out.length ? pts.slice(1) : pts);
+        });
+        return out;
+    }
+    return {
+        layer: function(name) {
+            return {type: 'FeatureCollection', features: (topo.objects[name] || []).map(function(f) {
+                return {type: 'Feature', properties: f.p, geometry: {
+                    type: 'MultiPolygon', coordinates: f.g.map(function(poly) { return poly.map(ring); })
+                }};
+            })};
+        }
+    };
+};
+"""
+
+
+def is_polygonal(frame):
+    """
+    True if every geometry of the frame is a (Multi)Polygon, the only types
+    the encoding handles.
+    """
+    return bool(frame.geom_type.isin(['Polygon', 'MultiPolygon']).all())
+
+
+def _polygons(geometry):
+    # [[ring coords (n x 2, closed)] per polygon] of a (Multi)Polygon
+    polygons = []
+    for polygon in shapely.get_parts(geometry):
+        if polygon.is_empty:
+            continue
+        rings = [np.asarray(polygon.exterior.coords)[:, :2]]
+        rings += [np.asarray(interior.coords)[:, :2] for interior in polygon.interiors]
+        polygons.append(rings)
+    return polygons
+
+
+def _ring_keys(coords, translate):
+    # Quantized point keys of a closed ring, without the closing point and
+    # consecutive repeats
+    q = np.round((coords - translate) / QUANTUM).astype(np.int64)
+    keys = (q[:, 0] << _SHIFT) | q[:, 1]
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    if len(keys) > 1 and keys[0] == keys[-1]:
+        keys = keys[:-1]
+    return keys.tolist()
+
+
+def _junctions(rings):
+    # Points where rings meet or part: seen again with other neighbours
+    neighbours = {}
+    junctions = set()
+    for ring in rings:
+        n = len(ring)
+        for i, point in enumerate(ring):
+            pair = (ring[i - 1], ring[(i + 1) % n])
+            seen = neighbours.get(point)
+            if seen is None:
+                neighbours[point] = pair
+            elif seen != pair and seen != pair[::-1]:
+                junctions.add(point)
+    return junctions
+
+
+def _rotate_to_min(ring):
+    start = ring.index(min(ring))
+    return ring[start:] + ring[:start]
+
+
+class _ArcIndex:
+    """
+    Deduplicated arcs: a reversed copy of a known arc is referenced as ~index.
+    """
+
+    def __init__(self):
+        self.arcs = []
+        self._index = {}
+
+    def ref(self, arc):
+        arc = tuple(arc)
+        if arc in self._index:
+            return self._index[arc]
+        reverse = arc[::-1]
+        if reverse in self._index:
+            return ~self._index[reverse]
+        self._index[arc] = len(self.arcs)
+        self.arcs.append(arc)
+        return len(self.arcs) - 1
+
+    def closed_ring(self, ring):
+        # A ring without junctions is one arc, rotated to a canonical start so
+        # that the same ring in another layer matches it
+        forward = _rotate_to_min(ring)
+        backward = _rotate_to_min(ring[::-1])
+        arc = tuple(forward + forward[:1])
+        if arc in self._index:
+            return self._index[arc]
+        back = tuple(backward + backward[:1])
+        if back in self._index:
+            return ~self._index[back]
+        return self.ref(arc)
+
+
+def _encode_ring(ring, junctions, arc_index):
+    cuts = [i for i, point in enumerate(ring) if point in junctions]
+    if not cuts:
+        return [arc_index.closed_ring(ring)]
+    # Start at the first junction and cut at every other one
+    ring = ring[cuts[0]:] + ring[:cuts[0]]
+    cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+    ring = ring + ring[:1]
+    return [arc_index.ref(ring[a:b + 1]) for a, b in zip(cuts[:-1], cuts[1:])]
+
+
+def _delta_encode(arc):
+    flat = []
+    px = py = 0
+    for key in arc:
+        x, y = key >> _SHIFT, key & _MASK
+        flat += (x - px, y - py)
+        px, py = x, y
+    return flat
+
+
+def encode_layers(layers):
+    """
+    Encodes {layer name: (frame, property columns)} as one topology and
+    returns it as a compact JSON string. Frames must be polygonal
+    (is_polygonal) and in lon/lat.
+    """
+    frames = [frame for frame, _ in layers.values() if not frame.empty]
+    bounds = np.array([frame.total_bounds for frame in frames]) if frames else np.zeros((1, 4))
+    translate = bounds[:, :2].min(axis=0)
+
+    features = {}
+    all_rings = []
+    for name, (frame, columns) in layers.items():
+        columns = [c for c in columns if c in frame.columns]
+        records = frame[columns].astype(object).where(frame[columns].notna(), None).to_dict('records')
+        if not columns:
+            # to_dict gives no records at all for a frame without columns
+            records = [{}] * len(frame)
+        encoded = []
+        for props, geometry in zip(records, frame.geometry.values):
+            polygons = []
+            for rings in ([] if geometry is None else _polygons(geometry)):
+                keys = [_ring_keys(coords, translate) for coords in rings]
+                # Rings collapsed by the quantization are dropped (with their
+                # holes, for an exterior)
+                if len(keys[0]) < 3:
+                    continue
+                keys = [ring for ring in keys if len(ring) >= 3]
+                polygons.append(keys)
+                all_rings.extend(keys)
+            encoded.append((props, polygons))
+        features[name] = encoded
+
+    junctions = _junctions(all_rings)
+    arc_index = _ArcIndex()
+    objects = {
+        name: [
+            {"p": props, "g": [[_encode_ring(ring, junctions, arc_index) for ring in rings] for rings in polygons]}
+            for props, polygons in encoded
+        ]
+        for name, encoded in features.items()
+    }
+
+    topology = {
+        "scale": QUANTUM,
+        "translate": translate.tolist(),
+        "arcs": [_delta_encode(arc) for arc in arc_index.arcs],
+        "objects": objects,
+    }
+    return json.dumps(topology, separators=(',', ':'), ensure_ascii=False, default=str)
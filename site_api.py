@@ -0,0 +1,438 @@
+"""
+Local HTTP API over the data store, for tools that need the merged site data
+without going through the Streamlit UI.
+
+Endpoints (GET or HEAD, JSON unless noted):
+
+    /sites                          site list with headline metrics
+    /sites/<id>                     original and proposed attributes, metrics
+                                    and spatial matches
+    /sites/<id>/geometry            GeoJSON; ?kind=orig|prop|both (default both)
+                                    and ?level=0..4|auto (simplification level,
+                                    geometry_pyramid.py; default 0 = full detail)
+    /sites/<id>/popup               PopupInfo HTML (text/html)
+
+Every response carries a content-based ETag (one per content encoding), so
+a client polling with If-None-Match gets a 304 until that resource actually
+changes, even when other sites were updated. Bodies are compressed with brotli (if installed) or
+gzip according to Accept-Encoding, and uncompressed requests may ask for a
+single byte Range. Rendered responses are kept in a bounded LRU per data
+version; the data itself is the same SiteData the app uses, reloaded when the
+files on disk change.
+
+Usage:
+    python site_api.py [--host 127.0.0.1] [--port 8765]
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import re
+import sys
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import geometry_pyramid
+import site_store
+import site_views
+import telemetry
+from lru import LRUCache
+from site_store import DATA_DIR, KEY_COLUMNS
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+RESPONSE_CACHE_SIZE = 256
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+# How often the data files are checked for changes (seconds)
+RELOAD_SECONDS = 5
+KEEPALIVE_SECONDS = 30
+MAX_HEADER_LINES = 100
+
+REASONS = {
+    200: "OK", 206: "Partial Content", 304: "Not Modified", 400: "Bad Request",
+    404: "Not Found", 405: "Method Not Allowed", 414: "URI Too Long", 416: "Range Not Satisfiable",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Resource:
+    """
+    A rendered response body with its content type, ETag and the encoded
+    variants produced so far.
+    """
+    __slots__ = ('body', 'content_type', 'digest', 'encoded')
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+        self.digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.encoded = {}
+
+    def etag(self, encoding=None):
+        # Strong validators differ per representation: each encoding gets its own
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def encode(self, encoding):
+        if encoding not in self.encoded:
+            if encoding == 'br':
+                self.encoded[encoding] = brotli.compress(self.body, quality=5)
+            else:
+                self.encoded[encoding] = gzip.compress(self.body, compresslevel=6)
+        return self.encoded[encoding]
+
+
+def _json_resource(data):
+    return Resource(json.dumps(data, ensure_ascii=False, default=str).encode('utf-8'),
+                    'application/json; charset=utf-8')
+
+
+# -----------------------------------------------------------------------------
+# ENDPOINTS
+# -----------------------------------------------------------------------------
+def site_list(site_data):
+    overview = site_data.overview_rows(site_data.overview_query('Codrnap', ascending=True))
+    labels = {site_data.site_id(option): option for option in site_data.options or ()}
+    sites = []
+    for record in site_views.json_records(overview):
+        record['label'] = labels.get(str(record['Codrnap']))
+        sites.append(record)
+    return _json_resource({"version": site_data.version, "sites": sites})
+
+
+def _site_rows(site_data, site_id):
+    rows_orig = site_data.rows('orig', site_id)
+    rows_prop = site_data.rows('prop', site_id)
+    if rows_orig.empty and rows_prop.empty:
+        raise ApiError(404, f"Site {site_id} not found")
+    return rows_orig, rows_prop
+
+
+def site_attributes(site_data, site_id):
+    rows_orig, rows_prop = _site_rows(site_data, site_id)
+    return _json_resource({
+        "id": site_id,
+        "metrics": site_views.site_metrics(rows_orig, rows_prop, site_data.comparison(site_id)),
+        "orig": site_views.json_records(site_views.attribute_table(rows_orig)),
+        "prop": site_views.json_records(site_views.attribute_table(rows_prop, extra_drop=['PopupInfo'])),
+        "matches": site_views.json_records(
+            site_data.matches('orig' if not rows_orig.empty else 'prop', site_id)),
+    })
+
+
+def parse_level(value, rows_orig, rows_prop):
+    if value == 'auto':
+        return geometry_pyramid.level_for_bounds(site_store.site_bounds(rows_orig, rows_prop))
+    try:
+        level = int(value)
+    except ValueError:
+        level = -1
+    if level != 0 and level not in geometry_pyramid.LEVELS:
+        raise ApiError(400, f"level must be 0-{max(geometry_pyramid.LEVELS)} or 'auto'")
+    return level
+
+
+def site_geometry(site_data, site_id, kind='both', level='0', data_dir=DATA_DIR):
+    """
+    GeoJSON FeatureCollection of the site's original and/or proposed
+    geometry at the given pyramid level, with 'kind' and the site key as
+    properties.
+    """
+    if kind not in ('orig', 'prop', 'both'):
+        raise ApiError(400, "kind must be 'orig', 'prop' or 'both'")
+    rows_orig, rows_prop = _site_rows(site_data, site_id)
+    level = parse_level(level, rows_orig, rows_prop)
+
+    features = []
+    for k, rows in (('orig', rows_orig), ('prop', rows_prop)):
+        if kind not in (k, 'both') or rows.empty:
+            continue
+        site = site_store.site_geometry(rows, k, data_dir, level=level)
+        layer = json.loads(site[[KEY_COLUMNS[k], 'geometry']].to_json(drop_id=True))
+        for feature in layer['features']:
+            feature['properties']['kind'] = k
+            features.append(feature)
+    return _json_resource({"type": "FeatureCollection", "level": level, "features": features})
+
+
+def site_popup(site_data, site_id, data_dir=DATA_DIR):
+    _, rows_prop = _site_rows(site_data, site_id)
+    popup = site_store.popup_info(rows_prop.iloc[0], data_dir) if not rows_prop.empty else None
+    if not popup:
+        raise ApiError(404, f"Site {site_id} has no PopupInfo")
+    return Resource(popup.encode('utf-8'), 'text/html; charset=utf-8')
+
+
+def route(site_data, path, query, data_dir=DATA_DIR):
+    """
+    Renders the resource at path (blocking: runs in a worker thread).
+    Geometries and PopupInfo are read from the store in data_dir.
+    """
+    parts = [unquote(p) for p in path.strip('/').split('/') if p]
+    if parts == ['sites']:
+        return site_list(site_data)
+    if len(parts) == 2 and parts[0] == 'sites':
+        return site_attributes(site_data, parts[1])
+    if len(parts) == 3 and parts[0] == 'sites' and parts[2] == 'geometry':
+        return site_geometry(site_data, parts[1], query.get('kind', 'both'), query.get('level', '0'), data_dir)
+    if len(parts) == 3 and parts[0] == 'sites' and parts[2] == 'popup':
+        return site_popup(site_data, parts[1], data_dir)
+    raise ApiError(404, f"No such endpoint: {path}")
+
+
+# -----------------------------------------------------------------------------
+# HTTP
+# -----------------------------------------------------------------------------
+def accepted_encoding(header):
+    """
+    Preferred supported encoding of an Accept-Encoding header, or None.
+    """
+    offered = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    for encoding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+        if offered.get(encoding, offered.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def byte_range(header, size):
+    """
+    (start, end) inclusive of a single 'bytes=a-b' Range header, None if it
+    cannot be satisfied.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def _error(message):
+    # (headers, body) of a JSON error response
+    body = json.dumps({"error": str(message)}, ensure_ascii=False).encode('utf-8')
+    return {'Content-Type': 'application/json; charset=utf-8'}, body
+
+
+class SiteApi:
+    """
+    Serves the endpoints from the shared SiteData, reloading it when the data
+    signature changes (checked at most every RELOAD_SECONDS).
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.site_data = None
+        self.cache = LRUCache(RESPONSE_CACHE_SIZE)
+        self._checked = 0
+        self._lock = asyncio.Lock()
+
+    async def current(self):
+        loop = asyncio.get_running_loop()
+        if self.site_data is not None and time.monotonic() - self._checked < RELOAD_SECONDS:
+            return self.site_data
+        async with self._lock:
+            if self.site_data is None or time.monotonic() - self._checked >= RELOAD_SECONDS:
+                signature = await loop.run_in_executor(None, site_store.data_signature, self.data_dir)
+                if self.site_data is None or signature != self.site_data.version:
+                    site_data = await loop.run_in_executor(None, site_store.load_site_data, self.data_dir)
+                    if site_data is not None:
+                        self.site_data = site_data
+                        self.cache.clear()
+                self._checked = time.monotonic()
+        if self.site_data is None:
+            raise ApiError(503, "Site data could not be loaded")
+        return self.site_data
+
+    async def resource(self, path, query):
+        site_data = await self.current()
+        key = (site_data.version, path, tuple(sorted(query.items())))
+        resource = self.cache.get(key)
+        if resource is None:
+            resource = await asyncio.get_running_loop().run_in_executor(
+                None, route, site_data, path, query, self.data_dir)
+            self.cache.put(key, resource)
+        return resource
+
+    async def respond(self, method, target, headers):
+        """
+        Returns (status, headers, body) for one request.
+        """
+        if method not in ('GET', 'HEAD'):
+            raise ApiError(405, f"Method {method} not allowed")
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        resource = await self.resource(url.path, query)
+
+        body = resource.body
+        # Ranges refer to the identity body, so they are served uncompressed
+        range_header = headers.get('range')
+        if range_header and headers.get('if-range', resource.etag()) != resource.etag():
+            range_header = None
+        encoding = None
+        if not range_header and len(body) >= MIN_COMPRESS_BYTES:
+            encoding = accepted_encoding(headers.get('accept-encoding', ''))
+
+        out = {
+            'Content-Type': resource.content_type,
+            'ETag': resource.etag(encoding),
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+            'Accept-Ranges': 'bytes',
+        }
+        if_none_match = headers.get('if-none-match')
+        if if_none_match and (if_none_match.strip() == '*' or resource.etag(encoding) in
+                              [t.strip().removeprefix('W/') for t in if_none_match.split(',')]):
+            return 304, out, b''
+
+        if range_header:
+            span = byte_range(range_header, len(body))
+            if span is None:
+                out['Content-Range'] = f"bytes */{len(body)}"
+                return 416, out, b''
+            start, end = span
+            out['Content-Range'] = f"bytes {start}-{end}/{len(body)}"
+            return 206, out, body[start:end + 1]
+
+        if encoding:
+            body = resource.encode(encoding)
+            out['Content-Encoding'] = encoding
+        return 200, out, body
+
+    async def read_request(self, reader):
+        """
+        Reads one request head (and skips its body). Returns (method, target,
+        version, headers), or None when the client is gone or idle. A
+        malformed or oversized head raises ApiError.
+        """
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            return None
+        except ValueError as err:  # longer than the stream limit (64 KiB)
+            raise ApiError(414, "Request line too long") from err
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError as err:
+            raise ApiError(400, "Malformed request line") from err
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES + 1):
+            try:
+                line = await reader.readline()
+            except ValueError as err:
+                raise ApiError(431, "Header line too long") from err
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ApiError(431, f"More than {MAX_HEADER_LINES} header lines")
+
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ApiError(400, "Invalid Content-Length")
+        if length:
+            await reader.readexactly(length)
+        return method, target, version, headers
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except ApiError as e:
+                    # Where the next request would start is unknown: answer and hang up
+                    await self._send(writer, 'GET', e.status, *_error(e), close=True)
+                    break
+                if request is None:
+                    break
+                method, target, version, headers = request
+
+                close = (headers.get('connection', '').lower() == 'close'
+                         or (version == 'HTTP/1.0' and headers.get('connection', '').lower() != 'keep-alive'))
+                with telemetry.span("api_request", method=method, path=urlsplit(target).path) as sp:
+                    try:
+                        status, out, body = await self.respond(method, target, headers)
+                    except ApiError as e:
+                        status, (out, body) = e.status, _error(e)
+                    except Exception as e:
+                        status, (out, body) = 500, _error(f"{type(e).__name__}: {e}")
+                    sp.set(status=status, bytes=len(body))
+                await self._send(writer, method, status, out, body, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer, method, status, headers, body, close=False):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        headers = dict(headers, **{'Content-Length': str(len(body)),
+                                   'Connection': 'close' if close else 'keep-alive'})
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+
+
+async def serve(host=HOST, port=PORT, data_dir=DATA_DIR):
+    api = SiteApi(data_dir)
+    await api.current()
+    server = await asyncio.start_server(api.handle, host, port)
+    print(f"Serving site data on http://{host}:{port}/sites")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP API over the site data store.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
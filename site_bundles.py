@@ -0,0 +1,378 @@
+"""
+Static export of the site view, for serving it without Streamlit.
+
+Pre-renders one bundle per site from the store, in a process pool:
+
+    <output_dir>/index.html                 national list, linking every site
+    <output_dir>/manifest.json              site ID -> bundle files and data version
+    <output_dir>/sitios/<Codrnap>/
+        index.html                          metrics, attributes, PopupInfo, ficha
+        mapa_original.html                  create_dual_map, primary='orig'
+        mapa_propuesto.html                 create_dual_map, primary='prop'
+        ficha.webp                          screen-sized Ficha (when there is one; the
+                                            original .jpg if it could not be converted)
+        sitio.json                          metrics, attribute tables and spatial matches
+
+Every page only uses relative links, so the output directory can be copied
+as-is to any web server or CDN. Exporting only some sites (--sites) adds them
+to the bundles already in the output directory.
+
+Usage:
+    python site_bundles.py [output_dir] [--workers N] [--chunk-workers N] [--sites ID ...]
+"""
+import argparse
+import html
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import fichas
+import geometry_pyramid
+import site_maps
+import site_store
+from site_store import DATA_DIR
+from site_views import attribute_table, json_records, metric_html, site_metrics
+
+BUNDLE_DIR = "bundles"
+SITES_DIRNAME = "sitios"
+MAP_FILES = {"orig": "mapa_original.html", "prop": "mapa_propuesto.html"}
+FICHA_NAME = "ficha"
+DATA_FILE = "sitio.json"
+
+# Same dark theme as the app
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body {{ background: #0b0e11; color: #d1d5db; font-family: 'Source Sans Pro', Arial, sans-serif; margin: 0 auto; max-width: 1400px; padding: 20px; }}
+h1, h2, h3 {{ color: #ffffff; }}
+a {{ color: #00d4ff; }}
+.columns {{ display: flex; gap: 24px; flex-wrap: wrap; }}
+.column {{ flex: 1 1 600px; min-width: 0; }}
+.metrics {{ display: grid; grid-template-columns: 1fr 1fr; gap: 0 16px; }}
+iframe {{ border: none; width: 100%; height: 400px; }}
+details {{ background: #1a1e26; border: 1px solid #2d333b; border-radius: 10px; padding: 15px; margin: 10px 0; }}
+summary {{ color: #ffffff; cursor: pointer; }}
+table {{ width: 100%; border-collapse: collapse; background: #1a1e26; color: #ffffff; }}
+td, th {{ background: #1a1e26 !important; color: #ffffff !important; padding: 8px; text-align: left; border-bottom: 1px solid #2d333b; }}
+th {{ border-bottom: 2px solid #8b31c7; }}
+img {{ max-width: 100%; }}
+.caption {{ color: #888; font-size: 0.9rem; }}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+# -----------------------------------------------------------------------------
+# PAGES
+# -----------------------------------------------------------------------------
+def _details(summary, content, expanded=False):
+    return f"<details{' open' if expanded else ''}><summary>{summary}</summary>{content}</details>"
+
+
+def _column_orig(site_orig, metrics, has_map):
+    parts = ["<h2>Sitio Original (Ley 19.300)</h2>"]
+    if site_orig.empty:
+        parts.append("<p>Sin datos para este sitio.</p>")
+        return ''.join(parts)
+
+    row = site_orig.iloc[0]
+    parts.append('<div class="metrics">')
+    parts.append(metric_html("Superficie", metrics['Has_orig'], "ha"))
+    parts.append(metric_html("Perímetro", metrics['Perim_km_orig'], "km"))
+    parts.append('</div>')
+    if has_map:
+        parts.append(f'<iframe src="{MAP_FILES["orig"]}" loading="lazy" title="Mapa original"></iframe>')
+
+    designacion = row['designacio'] if 'designacio' in row else "N/A"
+    parts.append(f'<p class="caption"><b>Designación:</b> {html.escape(str(designacion))}</p>')
+    url_simbio = row['URL_SIMBIO'] if 'URL_SIMBIO' in row else None
+    if isinstance(url_simbio, str) and url_simbio:
+        parts.append(f'<p><a href="{html.escape(url_simbio)}" target="_blank" rel="noopener">'
+                     '🔗 Ver Descripción en SIMBIO</a></p>')
+
+    table = attribute_table(site_orig).T.to_html(header=False, na_rep='')
+    parts.append(_details("Ver Atributos Detallados", table, expanded=True))
+    return ''.join(parts)
+
+
+def _column_prop(site_prop, metrics, has_map, ficha_file, popup):
+    parts = ["<h2>Sitio Propuesto (Ley 21.600)</h2>"]
+    if site_prop.empty:
+        parts.append("<p>No se encontró geometría propuesta para este sitio.</p>")
+        return ''.join(parts)
+
+    row_p = site_prop.iloc[0]
+    parts.append('<div class="metrics">')
+    parts.append(metric_html("Superficie", metrics['Has_prop'], "ha", metrics['delta_has']))
+    parts.append(metric_html("Perímetro", metrics['Perim_km_prop'], "km", metrics['delta_perim_km']))
+    if metrics.get('iou') is not None:
+        parts.append(metric_html("Superposición (IoU)", metrics['iou'] * 100, "%"))
+        parts.append(metric_html("Diferencia simétrica", metrics['symdiff_ha'], "ha"))
+        parts.append(metric_html("Intersección", metrics['inter_ha'], "ha"))
+        parts.append(metric_html("Distancia de Hausdorff", metrics['hausdorff_m'], "m"))
+    parts.append('</div>')
+    if has_map:
+        parts.append(f'<iframe src="{MAP_FILES["prop"]}" loading="lazy" title="Mapa propuesto"></iframe>')
+
+    zona = row_p['FolderPath'] if 'FolderPath' in row_p else "N/A"
+    parts.append(f'<p class="caption"><b>Macro Zona / Carpeta:</b> {html.escape(str(zona))}</p>')
+
+    table = attribute_table(site_prop, extra_drop=['PopupInfo']).T.to_html(header=False, na_rep='')
+    parts.append(_details("Ver Atributos Propuestos", table))
+
+    if ficha_file:
+        ficha = f'<a href="{ficha_file}"><img src="{ficha_file}" loading="lazy" alt="Ficha"></a>'
+    else:
+        ficha = "<p>No se encontró ficha (imagen) para este sitio.</p>"
+    parts.append(_details("🖼️ Ver Ficha Técnica (Mapa Estático)", ficha))
+
+    # PopupInfo comes from the project's own KMZs and is shown as-is, like the app does
+    parts.append(_details("Ver Descripción Propuesta (PopupInfo)",
+                          popup or "<p>Sin información detallada en PopupInfo.</p>", expanded=True))
+    return ''.join(parts)
+
+
+def _related_table(related):
+    table = pd.DataFrame({
+        "Código": related['Name'],
+        "Intersección (ha)": related['inter_ha'].round(2),
+        "% del original": (related['share_orig'] * 100).round(1),
+        "% de la propuesta": (related['share_prop'] * 100).round(1),
+    }).to_html(index=False, na_rep='')
+    return _details("Propuestas relacionadas (superposición espacial)", table, expanded=True)
+
+
+def site_page(title, site_orig, site_prop, metrics, maps, ficha_file, popup, related=None):
+    column_prop = _column_prop(site_prop, metrics, "prop" in maps, ficha_file, popup)
+    if site_prop.empty and "prop" in maps:
+        column_prop += f'<iframe src="{MAP_FILES["prop"]}" loading="lazy" title="Mapa propuesto"></iframe>'
+    if related is not None and not related.empty:
+        column_prop += _related_table(related)
+    body = (
+        '<p><a href="../../index.html">← Todos los sitios</a></p>'
+        f'<h1>Sitio: {html.escape(title)}</h1>'
+        '<div class="columns">'
+        f'<div class="column">{_column_orig(site_orig, metrics, "orig" in maps)}</div>'
+        f'<div class="column">{column_prop}</div>'
+        '</div>'
+    )
+    return PAGE_TEMPLATE.format(title=html.escape(title), body=body)
+
+
+def index_page(site_data, labels):
+    """
+    National list: the overview table, one link per site.
+    """
+    overview = site_data.overview_rows(site_data.overview_query('Codrnap', ascending=True))
+    rows = []
+    for record in overview.itertuples(index=False):
+        site_id = str(record.Codrnap)
+        if site_id not in labels:
+            continue
+        cells = [
+            f'<a href="{SITES_DIRNAME}/{html.escape(site_id)}/index.html">{html.escape(labels[site_id])}</a>',
+            html.escape(str(record.FolderPath)) if pd.notna(record.FolderPath) else '',
+        ]
+        for value in (record.Has_orig, record.Has_prop, record.delta_has, record.iou * 100):
+            cells.append('' if pd.isna(value) else f"{value:,.2f}")
+        rows.append('<tr>' + ''.join(f'<td>{c}</td>' for c in cells) + '</tr>')
+
+    body = (
+        '<h1>Monitor de Sitios Prioritarios - Ley 21.600</h1>'
+        f'<p class="caption">{len(rows)} sitios</p>'
+        '<table><tr><th>Sitio</th><th>Macro Zona</th><th>Superficie original (ha)</th>'
+        '<th>Superficie propuesta (ha)</th><th>Δ Superficie (ha)</th><th>Superposición (IoU, %)</th></tr>'
+        + ''.join(rows) + '</table>'
+    )
+    return PAGE_TEMPLATE.format(title="Monitor de Sitios Prioritarios", body=body)
+
+
+# -----------------------------------------------------------------------------
+# EXPORT
+# -----------------------------------------------------------------------------
+def _write_text(path, text):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def export_site(site_data, site_id, title, out_dir, data_dir=DATA_DIR):
+    """
+    Writes the bundle of one site into out_dir/<site_id>/.
+    Returns the list of files written (relative to the bundle directory).
+    """
+    site_dir = os.path.join(out_dir, site_id)
+    os.makedirs(site_dir, exist_ok=True)
+
+    # Same data path as the app's sections 7 and 8
+    rows_orig = site_data.rows('orig', site_id)
+    rows_prop = site_data.rows('prop', site_id)
+    site_matches = site_data.matches('orig', site_id)
+    related = site_matches[site_matches['Name'] != site_id]
+    rows_related = site_data.rows('prop', list(related['Name']))
+    level = geometry_pyramid.level_for_bounds(site_store.site_bounds(rows_orig, rows_prop, rows_related))
+    site_orig = site_store.site_geometry(rows_orig, 'orig', data_dir, level=level)
+    site_prop = site_store.site_geometry(rows_prop, 'prop', data_dir, level=level)
+    site_related = site_store.site_geometry(rows_related, 'prop', data_dir, level=level)
+    metrics = site_metrics(site_orig, site_prop, site_data.comparison(site_id))
+
+    files = []
+    maps = {}
+    cache_key = (site_id, site_data.version, level)
+    for primary, name in MAP_FILES.items():
+        if site_orig.empty if primary == 'orig' else (site_prop.empty and site_related.empty):
+            continue
+        map_html = site_maps.dual_map_html(site_orig, site_prop, primary=primary, cache_key=cache_key,
+                                           feature_related=site_related)
+        if map_html:
+            _write_text(os.path.join(site_dir, name), map_html)
+            maps[primary] = name
+            files.append(name)
+
+    ficha_file = None
+    fichas_dir, cache_dir = fichas.ficha_dirs(data_dir)
+    if fichas.ficha_source(site_id, fichas_dir):
+        # ficha_image falls back to the original JPEG: keep its real extension
+        image = fichas.ficha_image(site_id, "screen", fichas_dir, cache_dir)
+        ficha_file = FICHA_NAME + os.path.splitext(image)[1].lower()
+        for name in os.listdir(site_dir):
+            if os.path.splitext(name)[0] == FICHA_NAME and name != ficha_file:
+                os.remove(os.path.join(site_dir, name))
+        shutil.copyfile(image, os.path.join(site_dir, ficha_file))
+        files.append(ficha_file)
+
+    popup = site_store.popup_info(site_prop.iloc[0], data_dir) if not site_prop.empty else None
+
+    data = {
+        "id": site_id,
+        "title": title,
+        "metrics": metrics,
+        "orig": json_records(attribute_table(site_orig)),
+        "prop": json_records(attribute_table(site_prop, extra_drop=['PopupInfo'])),
+        "popup_info": popup,
+        "matches": json_records(site_matches),
+    }
+    _write_text(os.path.join(site_dir, DATA_FILE), json.dumps(data, ensure_ascii=False, default=str))
+    files.append(DATA_FILE)
+
+    _write_text(os.path.join(site_dir, "index.html"),
+                site_page(title, site_orig, site_prop, metrics, maps, ficha_file, popup, related))
+    files.append("index.html")
+    return files
+
+
+# Per worker process: the SiteData, read once from the store
+_worker_data = None
+
+
+def _init_worker(data_dir):
+    global _worker_data
+    _worker_data = site_store.load_site_data(data_dir)
+
+
+def _export_task(args):
+    site_id, title, out_dir, data_dir = args
+    try:
+        files = export_site(_worker_data, site_id, title, out_dir, data_dir)
+    except Exception as e:
+        return site_id, None, f"{type(e).__name__}: {e}"
+    finally:
+        # Every site is rendered once: do not keep its maps around
+        site_maps.clear_cache()
+    return site_id, files, None
+
+
+def read_manifest(output_dir=BUNDLE_DIR):
+    """
+    Returns the manifest of the bundles in output_dir, or None if there is none.
+    """
+    try:
+        with open(os.path.join(output_dir, "manifest.json"), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export_bundles(output_dir=BUNDLE_DIR, data_dir=DATA_DIR, workers=None, site_ids=None, on_warning=print,
+                   chunk_workers=None):
+    """
+    Pre-renders the bundle of every site (or only site_ids) in a pool of
+    workers processes and writes the index and manifest. The store is
+    refreshed first (chunk_workers threads reading chunks, see
+    site_store.read_chunk_frames), so the workers only read it. Bundles already in output_dir are kept in the
+    manifest and index, unless their site is gone or failed to export now.
+    Returns the manifest, or None if there is no data.
+    """
+    if not site_store.refresh_store(data_dir, chunk_workers, on_warning):
+        return None
+    site_data = site_store.load_site_data(data_dir, on_warning=on_warning)
+    if site_data is None or site_data.options is None:
+        return None
+
+    labels = {site_data.site_id(option): option for option in site_data.options}
+    targets = list(labels) if site_ids is None else [s for s in site_ids if s in labels]
+    for site_id in site_ids or []:
+        if site_id not in labels:
+            on_warning(f"Site {site_id} not found, skipped.")
+
+    sites_dir = os.path.join(output_dir, SITES_DIRNAME)
+    os.makedirs(sites_dir, exist_ok=True)
+    tasks = [(site_id, labels[site_id], sites_dir, data_dir) for site_id in targets]
+
+    workers = workers or os.cpu_count() or 1
+    previous = read_manifest(output_dir) or {}
+    bundles = {site_id: files for site_id, files in previous.get("sites", {}).items() if site_id in labels}
+    versions = {site_id: previous.get("versions", {}).get(site_id, previous.get("version"))
+                for site_id in bundles}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_dir,)) as pool:
+        chunksize = max(1, len(tasks) // (workers * 4))
+        for site_id, files, error in pool.map(_export_task, tasks, chunksize=chunksize):
+            if error is not None:
+                # Its earlier bundle, if any, may now be half overwritten
+                on_warning(f"Site {site_id} not exported: {error}")
+                bundles.pop(site_id, None)
+                versions.pop(site_id, None)
+                continue
+            bundles[site_id] = [f"{SITES_DIRNAME}/{site_id}/{name}" for name in files]
+            versions[site_id] = site_data.version
+
+    _write_text(os.path.join(output_dir, "index.html"),
+                index_page(site_data, {site_id: labels[site_id] for site_id in bundles}))
+    manifest = {"version": site_data.version, "sites": bundles, "versions": versions}
+    _write_text(os.path.join(output_dir, "manifest.json"), json.dumps(manifest, ensure_ascii=False, indent=1))
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exports static per-site bundles of the site view.")
+    parser.add_argument("output_dir", nargs="?", default=BUNDLE_DIR)
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-workers", type=int,
+                        help="threads reading chunks when the store is refreshed (default: site_store.CHUNK_WORKERS)")
+    parser.add_argument("--sites", nargs="+", help="only export these site IDs (Codrnap)")
+    args = parser.parse_args(argv)
+
+    manifest = export_bundles(args.output_dir, workers=args.workers, site_ids=args.sites,
+                              chunk_workers=args.chunk_workers)
+    if manifest is None:
+        print("Error: no data to export, see messages above.")
+        return 1
+    print(f"{len(manifest['sites'])} site bundles in {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+Folium maps for the site view (original vs. proposed).
+
+The layers of a site are encoded once as a shared, quantized topology
+(map_topology.py) that is decoded in the browser, and that same payload is
+embedded in both maps (primary='orig' and primary='prop'). The rendered map
+HTML is kept in a bounded LRU keyed by site ID and data version, so
+revisiting a site does not rebuild anything.
+
+The national overview map reports its viewport back to the app
+(streamlit-folium), which loads only the sites in view, at the pyramid level
+of the zoom, and swaps them in as a layer without redrawing the map.
+"""
+import json
+import math
+
+import folium
+from branca.element import MacroElement, Template
+
+import map_topology
+import telemetry
+from lru import LRUCache
+
+MAP_CACHE_SIZE = 64
+
+STYLE_ORIG = {'fillColor': '#ff0000', 'color': 'red', 'weight': 2, 'fillOpacity': 0.5}
+STYLE_PROP = {'fillColor': '#00ff00', 'color': 'green', 'weight': 2, 'fillOpacity': 0.5}
+STYLE_RELATED = {'fillColor': '#ffa500', 'color': 'orange', 'weight': 2, 'fillOpacity': 0.3, 'dashArray': '5, 5'}
+
+
+# MAP_CACHE_SIZE sites: two layers and two maps (primary 'orig' / 'prop') each
+_layer_cache = LRUCache(MAP_CACHE_SIZE * 2)
+_html_cache = LRUCache(MAP_CACHE_SIZE * 2)
+
+
+class SiteTopology(MacroElement):
+    """
+    Declares a site's encoded topology (map_topology.encode_layers) in the
+    map script, decoded once in the browser for all the layers that use it.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        {{ this.decoder }}
+        var {{ this.get_name() }} = window.decodeSiteTopology({{ this.data_json }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, data_json):
+        super().__init__()
+        self._name = 'SiteTopology'
+        self.data_json = data_json
+        self.decoder = map_topology.DECODER_JS
+
+    def layer(self, name):
+        """
+        JS expression of one layer of the topology, as GeoJSON.
+        """
+        return _TopologyLayer(self, name)
+
+
+class _TopologyLayer:
+    # Rendered lazily: streamlit-folium renames elements before rendering them
+    def __init__(self, topology, name):
+        self.topology = topology
+        self.name = name
+
+    def __str__(self):
+        return f"{self.topology.get_name()}.layer({json.dumps(self.name)})"
+
+
+class SerializedGeoJson(folium.map.Layer):
+    """
+    GeoJSON overlay built from an already serialized FeatureCollection string
+    (or a JS expression returning one, see SiteTopology.layer), so the same
+    serialization can be embedded in several maps without folium re-encoding
+    the geometry each time.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson({{ this.data_json }}, {
+            style: function() { return {{ this.style|tojson }}; }
+        });
+        {%- if this.tooltip_field %}
+        {{ this.get_name() }}.bindTooltip(function(layer) {
+            return {{ this.tooltip_alias|tojson }} + " " + layer.feature.properties[{{ this.tooltip_field|tojson }}];
+        });
+        {%- endif %}
+        {% endmacro %}
+    """)
+
+    def __init__(self, data_json, name, style, tooltip_field=None, tooltip_alias='', show=True):
+        super().__init__(name=name, overlay=True, control=True, show=show)
+        self._name = 'SerializedGeoJson'
+        self.data_json = data_json
+        self.style = style
+        self.tooltip_field = tooltip_field
+        self.tooltip_alias = tooltip_alias
+
+
+def layer_json(feature, tooltip_field=None, cache_key=None):
+    """
+    Serializes a site frame to GeoJSON, keeping only the tooltip property.
+    Cached under cache_key when given.
+    """
+    if cache_key is not None:
+        cached = _layer_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    columns = ['geometry']
+    if tooltip_field in feature.columns:
+        columns.insert(0, tooltip_field)
+    data_json = feature[columns].to_json(drop_id=True)
+
+    if cache_key is not None:
+        _layer_cache.put(cache_key, data_json)
+    return data_json
+
+
+# Layer name -> (tooltip field, layer title, style, tooltip alias)
+LAYERS = {
+    'orig': ('NombreOrig', 'Sitio Original', STYLE_ORIG, 'Nombre:'),
+    'prop': ('Name', 'Sitio Propuesto', STYLE_PROP, 'Código:'),
+    'related': ('Name', 'Propuestas relacionadas', STYLE_RELATED, 'Código:'),
+}
+
+
+def topology_json(features, cache_key=None):
+    """
+    Encodes the non-empty site frames ({layer name: frame}) as one topology,
+    keeping only the tooltip property. Cached under cache_key when given.
+    Returns None if a geometry is not polygonal (plain GeoJSON is used then).
+    """
+    if cache_key is not None:
+        cached = _layer_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    if not all(map_topology.is_polygonal(frame) for frame in features.values()):
+        return None
+    data_json = map_topology.encode_layers({
+        name: (frame, [LAYERS[name][0]]) for name, frame in features.items()
+    })
+
+    if cache_key is not None:
+        _layer_cache.put(cache_key, data_json)
+    return data_json
+
+
+def create_dual_map(feature_orig, feature_prop, primary='orig', cache_key=None, feature_related=None):
+    """
+    Creates a map with both layers, but sets visibility based on primary.
+    cache_key (e.g. (site ID, data version, pyramid level)) lets both maps of a
+    site share the layer serialization. feature_related (proposals with another
+    code overlapping the site) is added as a third layer, shown with the
+    proposed one.
+    """
+    with telemetry.span("create_dual_map", primary=primary):
+        return _create_dual_map(feature_orig, feature_prop, primary, cache_key, feature_related)
+
+
+def _create_dual_map(feature_orig, feature_prop, primary, cache_key, feature_related):
+    # Determine center and bounds from the primary feature found
+    center_geom = None
+    if primary == 'orig' and not feature_orig.empty:
+        center_geom = feature_orig.geometry.iloc[0]
+        bounds = feature_orig.total_bounds
+    elif primary == 'prop' and not feature_prop.empty:
+        center_geom = feature_prop.geometry.iloc[0]
+        bounds = feature_prop.total_bounds
+
+    # If primary is missing, try the other
+    if center_geom is None:
+        if not feature_orig.empty:
+            center_geom = feature_orig.geometry.iloc[0]
+            bounds = feature_orig.total_bounds
+        elif not feature_prop.empty:
+            center_geom = feature_prop.geometry.iloc[0]
+            bounds = feature_prop.total_bounds
+        elif feature_related is not None and not feature_related.empty:
+            center_geom = feature_related.geometry.iloc[0]
+            bounds = feature_related.total_bounds
+        else:
+            return None # No geometry at all
+
+    center = center_geom.centroid
+    m = folium.Map(location=[center.y, center.x], zoom_start=10, tiles='Esri.WorldImagery', attr='Esri')
+
+    features = {'orig': feature_orig, 'prop': feature_prop, 'related': feature_related}
+    features = {name: frame for name, frame in features.items() if frame is not None and not frame.empty}
+
+    # One shared topology for all layers; plain GeoJSON per layer as fallback
+    topology = None
+    data_json = topology_json(features, cache_key and cache_key + ('topology',))
+    if data_json is not None:
+        topology = SiteTopology(data_json)
+        topology.add_to(m)
+
+    for name, frame in features.items():
+        tooltip_field, title, style, alias = LAYERS[name]
+        if topology is not None:
+            data = topology.layer(name)
+        else:
+            data = layer_json(frame, tooltip_field, cache_key and cache_key + (name,))
+        SerializedGeoJson(
+            data,
+            name=title,
+            style=style,
+            tooltip_field=tooltip_field if tooltip_field in frame.columns else None,
+            tooltip_alias=alias,
+            # The related proposals are shown with the proposed site
+            show=(primary == 'orig') if name == 'orig' else (primary == 'prop'),
+        ).add_to(m)
+
+    folium.LayerControl().add_to(m)
+
+    if bounds is not None:
+        m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
+
+    return m
+
+
+def dual_map_html(feature_orig, feature_prop, primary='orig', cache_key=None, feature_related=None):
+    """
+    Returns the full HTML document of create_dual_map (None if there is no
+    geometry), served from the LRU when cache_key was seen before.
+    """
+    html_key = cache_key and cache_key + (primary,)
+    if html_key is not None:
+        cached = _html_cache.get(html_key)
+        if cached is not None:
+            telemetry.record("dual_map_html", 0, primary=primary, hit=True, bytes=len(cached))
+            return cached
+
+    m = create_dual_map(feature_orig, feature_prop, primary=primary, cache_key=cache_key,
+                        feature_related=feature_related)
+    html = None
+    if m is not None:
+        # folium serialization
+        with telemetry.span("dual_map_html", primary=primary, hit=False) as sp:
+            html = m.get_root().render()
+            sp.set(bytes=len(html))
+
+    if html_key is not None and html is not None:
+        _html_cache.put(html_key, html)
+    return html
+
+
+# -----------------------------------------------------------------------------
+# NATIONAL OVERVIEW
+# -----------------------------------------------------------------------------
+# Initial view: continental Chile
+OVERVIEW_BOUNDS = (-76.0, -56.0, -66.0, -17.5)
+OVERVIEW_CENTER = [-37.0, -71.0]
+OVERVIEW_ZOOM = 4
+
+# Sites per layer above which the overview draws points instead of outlines
+OVERVIEW_MAX_SITES = 400
+
+
+def overview_base_map():
+    """
+    Base map of the overview. It never changes, so streamlit-folium keeps it
+    (and the user's view) across reruns and only swaps the site layer.
+    """
+    return folium.Map(location=OVERVIEW_CENTER, zoom_start=OVERVIEW_ZOOM, tiles='Esri.WorldImagery', attr='Esri')
+
+
+def view_from_state(state):
+    """
+    (bounds, zoom) of the last view reported by st_folium (returned_objects
+    'bounds' and 'zoom'), or the initial view.
+    """
+    state = state or {}
+    bounds = state.get('bounds') or {}
+    try:
+        sw, ne = bounds['_southWest'], bounds['_northEast']
+        view = (float(sw['lng']), float(sw['lat']), float(ne['lng']), float(ne['lat']))
+    except (KeyError, TypeError, ValueError):
+        return OVERVIEW_BOUNDS, OVERVIEW_ZOOM
+    return view, int(state.get('zoom') or OVERVIEW_ZOOM)
+
+
+def snap_bounds(bounds):
+    """
+    Query window of a viewport: grown by half a view on each side and snapped
+    to a power-of-two grid of about the view's size, so that small pans keep
+    the same window (same layer, nothing reloaded).
+    """
+    minx, miny, maxx, maxy = bounds
+    step = 2.0 ** math.ceil(math.log2(max(maxx - minx, maxy - miny, 1e-6)))
+    return (
+        math.floor(minx / step - 0.5) * step, math.floor(miny / step - 0.5) * step,
+        math.ceil(maxx / step + 0.5) * step, math.ceil(maxy / step + 0.5) * step,
+    )
+
+
+def overview_layer(features, points=False, cache_key=None):
+    """
+    FeatureGroup with the sites in view ({'orig': frame, 'prop': frame}):
+    outlines sharing one topology, or points when there are too many.
+    cache_key (e.g. (data version, query window, level, points)) caches the
+    serialization.
+    """
+    group = folium.FeatureGroup(name='Sitios')
+    features = {name: frame for name, frame in features.items() if not frame.empty}
+
+    topology = None
+    if not points:
+        data_json = topology_json(features, cache_key and cache_key + ('topology',))
+        if data_json is not None:
+            topology = SiteTopology(data_json)
+            topology.add_to(group)
+
+    for name, frame in features.items():
+        tooltip_field, title, style, alias = LAYERS[name]
+        if points:
+            folium.GeoJson(
+                layer_json(frame, tooltip_field, cache_key and cache_key + (name,)),
+                name=title,
+                marker=folium.CircleMarker(radius=4, color=style['color'], fill=True,
+                                           fill_color=style['fillColor'], fill_opacity=0.8),
+                tooltip=folium.GeoJsonTooltip([tooltip_field], aliases=[alias]) if tooltip_field in frame.columns else None,
+            ).add_to(group)
+            continue
+        SerializedGeoJson(
+            topology.layer(name) if topology is not None else
+            layer_json(frame, tooltip_field, cache_key and cache_key + (name,)),
+            name=title,
+            style=style,
+            tooltip_field=tooltip_field if tooltip_field in frame.columns else None,
+            tooltip_alias=alias,
+        ).add_to(group)
+    return group
+
+
+def clear_cache():
+    _layer_cache.clear()
+    _html_cache.clear()
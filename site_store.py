@@ -0,0 +1,1453 @@
+"""
+Data store for the Monitor de Sitios Prioritarios.
+
+Merges the raw sources (Originals GeoJSON, proposed chunks, attribute JSONs and
+MacroZona KMZ descriptions) into the two frames used by the dashboard, and
+persists them as GeoParquet so the app can bulk-read them on cold start.
+
+Geometries are also written to a flat WKB file per frame; each row of the
+store keeps the byte offset/length of its geometry, so the app only holds the
+attribute table in memory and reads one site's geometry on demand. The same is
+done for every level of the simplified geometry pyramid (geometry_pyramid.py),
+and for the PopupInfo HTML of the proposed sites (zlib-compressed, without
+the XSLT <head> boilerplate), which is only read when it is displayed.
+Next to the comparison metrics of the same-code pairs, the store keeps the
+spatial matches between originals and proposals (compare_sites.match_sites),
+so the site view can show every proposal overlapping a site.
+
+Build or refresh the store with:
+    python site_store.py
+
+Refreshes are incremental: only the chunks and KMZs that changed since the
+last build are re-read and patched into the store (see refresh_store). Use
+--full to rebuild everything, which also compacts the blobs: a build writes
+them as a new generation (blob_file), so processes still holding frames of
+the previous build keep reading the blobs their offsets point into. Builds and
+refreshes hold an inter-process lock on the store (store_lock), as the app,
+the API and the bundle workers may all try to refresh it at once.
+"""
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import re
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import shapely
+
+import compare_sites
+import geometry_pyramid
+import telemetry
+import warm_start
+from split_data import MANIFEST_FILE
+from warm_start import DATA_DIR, STORE_DIRNAME, file_sha1
+
+STORE_VERSION = 9
+
+# Frames are keyed by kind: 'orig' (Ley 19.300) and 'prop' (Ley 21.600)
+KEY_COLUMNS = {"orig": "Codrnap", "prop": "Name"}
+STORE_FILES = {"orig": "sitios_originales.parquet", "prop": "sitios_propuestos.parquet"}
+GEOM_FILES = {"orig": "geometrias_originales.wkb", "prop": "geometrias_propuestas.wkb"}
+COMPARISON_FILE = "comparacion.parquet"
+MATCH_FILE = "coincidencias.parquet"
+POPUP_FILE = "popupinfo.bin"
+META_FILE = "store_meta.json"
+LOCK_FILE = "store.lock"
+
+# Geometry index columns: byte range of each row's WKB per pyramid level, and its bbox
+BBOX_COLUMNS = ['bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy']
+
+
+def index_columns(level=0):
+    if level == 0:
+        return ['geom_offset', 'geom_length']
+    return [f'geom_offset_{level}', f'geom_length_{level}']
+
+
+def geom_file(kind, level=0):
+    if level == 0:
+        return GEOM_FILES[kind]
+    return GEOM_FILES[kind].replace('.wkb', f'_L{level}.wkb')
+
+
+# Blobs are written per store generation (recorded in the meta and in every
+# row): a full build starts a new generation instead of truncating the blobs
+# that already loaded frames point into, refreshes append to the current one
+GENERATION_COLUMN = 'blob_generation'
+_GENERATION_RE = re.compile(r'_g(\d+)(\.\w+)$')
+
+
+def blob_file(name, generation):
+    """
+    File name of a blob (geom_file or POPUP_FILE) in the given generation.
+    """
+    root, ext = os.path.splitext(name)
+    return f"{root}_g{generation}{ext}"
+
+
+# Byte range of each proposed row's compressed PopupInfo in POPUP_FILE
+POPUP_COLUMNS = ['popup_offset', 'popup_length']
+
+PYRAMID_LEVELS = [0] + sorted(geometry_pyramid.LEVELS)
+INDEX_COLUMNS = ([c for level in PYRAMID_LEVELS for c in index_columns(level)] + BBOX_COLUMNS + POPUP_COLUMNS
+                 + [GENERATION_COLUMN])
+
+KMZ_FILES = ["MacroZonaNorte.kmz", "MacroZonaCentro.kmz", "MacroZonaSur.kmz"]
+
+# Concurrent chunk reads (override with the CHUNK_WORKERS environment variable)
+CHUNK_WORKERS = int(os.environ.get("CHUNK_WORKERS", 0)) or min(8, os.cpu_count() or 1)
+
+
+# -----------------------------------------------------------------------------
+# SOURCE PATHS
+# -----------------------------------------------------------------------------
+def store_dir(data_dir=DATA_DIR):
+    return os.path.join(data_dir, STORE_DIRNAME)
+
+
+def read_chunk_manifest(data_dir=DATA_DIR):
+    """
+    Returns the chunk manifest written by split_data.py, or None if there is none.
+    """
+    try:
+        with open(os.path.join(data_dir, "chunks", MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _bbox_intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def chunk_files(data_dir=DATA_DIR, ids=None, bounds=None):
+    """
+    Lists the proposed chunk files.
+    With a manifest, chunks come in manifest order and empty chunks are
+    skipped, as are chunks holding none of the given ids or whose bbox misses
+    bounds (minx, miny, maxx, maxy). Files on disk that the manifest does not
+    list are appended so they are never silently ignored.
+    """
+    chunk_dir = os.path.join(data_dir, "chunks")
+    on_disk = sorted(glob.glob(os.path.join(chunk_dir, "*.geojson")))
+    manifest = read_chunk_manifest(data_dir)
+    if manifest is None:
+        return on_disk
+
+    wanted = set(ids) if ids is not None else None
+    files = []
+    listed = set()
+    for chunk in manifest.get("chunks", []):
+        path = os.path.join(chunk_dir, chunk["file"])
+        listed.add(path)
+        if not chunk["features"] or not os.path.exists(path):
+            continue
+        if wanted is not None and wanted.isdisjoint(chunk["features"]):
+            continue
+        if bounds is not None and (not chunk.get("bbox") or not _bbox_intersects(chunk["bbox"], bounds)):
+            continue
+        files.append(path)
+
+    return files + [f for f in on_disk if f not in listed]
+
+
+def source_paths(data_dir=DATA_DIR):
+    """
+    Returns the raw input files the store is built from, grouped by role.
+    """
+    return {
+        "orig_geo": os.path.join(data_dir, "sitios_prior_originales.json"),
+        "orig_attr": os.path.join(data_dir, "sitios_prior_originales (1).json"),
+        "prop_attr": os.path.join(data_dir, "sitios_prior_propuestos (1).json"),
+        "chunks": chunk_files(data_dir),
+        "kmz": [os.path.join(data_dir, f) for f in KMZ_FILES],
+    }
+
+
+def _existing_sources(data_dir=DATA_DIR):
+    paths = source_paths(data_dir)
+    files = [paths["orig_geo"], paths["orig_attr"], paths["prop_attr"]]
+    files += paths["chunks"] + paths["kmz"]
+    return [f for f in files if os.path.exists(f)]
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": file_sha1(path)}
+
+
+def fingerprint_matches(path, entry):
+    """
+    Checks a file against a recorded fingerprint.
+    Size and mtime are compared first; the content hash is only computed when
+    the mtime changed (e.g. after a fresh git checkout).
+    """
+    stat = os.stat(path)
+    if stat.st_size != entry["size"]:
+        return False
+    return stat.st_mtime_ns == entry["mtime_ns"] or file_sha1(path) == entry["sha1"]
+
+
+def source_fingerprint(data_dir=DATA_DIR):
+    """
+    Returns {relative path: {size, mtime_ns, sha1}} for every existing source.
+    """
+    return {
+        os.path.relpath(path, data_dir): file_fingerprint(path)
+        for path in _existing_sources(data_dir)
+    }
+
+
+# -----------------------------------------------------------------------------
+# RAW SOURCES
+# -----------------------------------------------------------------------------
+def _local_tag(elem):
+    # Handle namespaced KML (usually {http://www.opengis.net/kml/2.2}Placemark)
+    return elem.tag.rsplit('}', 1)[-1]
+
+
+def parse_kmz(kmz_path):
+    """
+    Extracts {Name: Description} from the Placemarks of one KMZ.
+    Streams the KML with iterparse and clears every Placemark once read,
+    so memory does not grow with the size of the document.
+    """
+    descriptions = {}
+    with zipfile.ZipFile(kmz_path, 'r') as kmz:
+        # Find the first kml file
+        kml_filename = [f for f in kmz.namelist() if f.endswith('.kml')][0]
+        with kmz.open(kml_filename, 'r') as kml_file:
+            for _, elem in ET.iterparse(kml_file, events=('end',)):
+                if _local_tag(elem) != 'Placemark':
+                    continue
+                name_tag = None
+                desc_tag = None
+                for child in elem:
+                    if _local_tag(child) == 'name':
+                        name_tag = child
+                    elif _local_tag(child) == 'description':
+                        desc_tag = child
+
+                if name_tag is not None and desc_tag is not None and name_tag.text:
+                    descriptions[name_tag.text.strip()] = desc_tag.text
+                elem.clear()
+    return descriptions
+
+
+def _kmz_sidecar_path(kmz_path, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(store_dir(os.path.dirname(kmz_path)), "kmz")
+    return os.path.join(cache_dir, os.path.basename(kmz_path) + ".json")
+
+
+def _read_kmz_sidecar(kmz_path, cache_dir=None):
+    try:
+        with open(_kmz_sidecar_path(kmz_path, cache_dir), 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+        if fingerprint_matches(kmz_path, sidecar["source"]):
+            return sidecar["descriptions"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _write_kmz_sidecar(kmz_path, descriptions, cache_dir=None):
+    path = _kmz_sidecar_path(kmz_path, cache_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"source": file_fingerprint(kmz_path), "descriptions": descriptions}, f)
+    except OSError:
+        # Read-only deployments simply parse again next time
+        pass
+
+
+def kmz_description_sets(kmz_files, cache_dir=None):
+    """
+    Parses KMZ files to extract Placemark descriptions (HTML PopupInfo).
+    Returns {kmz path: {Name: Description}} for every KMZ that could be read,
+    in kmz_files order.
+
+    Each KMZ's result is cached in a sidecar JSON keyed by the KMZ's hash
+    (data/store/kmz/ by default); only KMZs without a valid sidecar are
+    parsed.
+    """
+    existing = [p for p in kmz_files if os.path.exists(p)]
+    with telemetry.span("kmz_descriptions", files=len(existing)) as sp:
+        results = {}
+        pending = []
+        for kmz_path in existing:
+            cached = _read_kmz_sidecar(kmz_path, cache_dir)
+            if cached is None:
+                pending.append(kmz_path)
+            else:
+                results[kmz_path] = cached
+
+        # Serially: a KMZ parses in well under a second, less than a spawned
+        # worker takes to start, and iterparse holds the GIL so threads do not help
+        parsed = [_parse_kmz_safe(kmz_path) for kmz_path in pending]
+
+        for kmz_path, descriptions in zip(pending, parsed):
+            if descriptions is None:
+                continue
+            results[kmz_path] = descriptions
+            _write_kmz_sidecar(kmz_path, descriptions, cache_dir)
+
+        # bytes: KMZ data actually parsed (sidecar hits cost no parsing)
+        sp.set(parsed=len(pending), bytes=sum(os.path.getsize(p) for p in pending))
+    return {p: results[p] for p in existing if p in results}
+
+
+def merge_descriptions(kmz_sets):
+    # Later files win on duplicate names, as before
+    descriptions = {}
+    for kmz_descriptions in kmz_sets.values():
+        descriptions.update(kmz_descriptions)
+    return descriptions
+
+
+def get_kmz_descriptions(kmz_files, cache_dir=None):
+    """
+    Returns a dictionary: {Name: Description} merged over kmz_files
+    (see kmz_description_sets).
+    """
+    return merge_descriptions(kmz_description_sets(kmz_files, cache_dir))
+
+
+def _parse_kmz_safe(kmz_path):
+    try:
+        return parse_kmz(kmz_path)
+    except Exception:
+        # Broken KMZs are skipped (PopupInfo falls back to the attribute JSON)
+        return None
+
+
+def read_chunk(path):
+    """
+    Reads one GeoJSON chunk through pyogrio's Arrow interface, falling back to
+    the regular reader when Arrow reads are not available in this GDAL/pyogrio.
+    """
+    try:
+        return gpd.read_file(path, engine="pyogrio", use_arrow=True)
+    except (ImportError, ValueError, RuntimeError):
+        return gpd.read_file(path)
+
+
+def _read_chunk_safe(path):
+    try:
+        return read_chunk(path), None
+    except Exception as e:
+        return None, e
+
+
+def read_chunk_frames(files, workers=None, on_warning=print):
+    """
+    Reads the proposed chunks concurrently (workers threads, CHUNK_WORKERS by
+    default; GDAL releases the GIL while parsing) and returns their frames in
+    the order of files, regardless of which read finishes first.
+    Failed chunks are reported through on_warning and come back as None.
+    """
+    workers = max(1, min(workers or CHUNK_WORKERS, len(files) or 1))
+    if workers == 1:
+        results = [_read_chunk_safe(f) for f in files]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_read_chunk_safe, files))
+
+    frames = []
+    for file, (gdf_chunk, error) in zip(files, results):
+        if error is not None:
+            on_warning(f"Error cargando chunk {file}: {error}")
+        frames.append(gdf_chunk)
+    return frames
+
+
+def concat_frames(frames):
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return gpd.GeoDataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_chunks(files, workers=None, on_warning=print):
+    """
+    Reads the proposed chunks (see read_chunk_frames) as a single frame, in
+    the order of files (manifest order, see chunk_files).
+    """
+    return concat_frames(read_chunk_frames(files, workers, on_warning))
+
+
+def query_chunks(data_dir=DATA_DIR, ids=None, bounds=None, workers=None, on_warning=print):
+    """
+    Proposed rows with one of the given ids (Name) and/or intersecting bounds,
+    read straight from the chunks without a store. Only the chunks the
+    manifest says can hold them are opened (see chunk_files). Rows come as in
+    the chunks, without the attribute JSON or KMZ PopupInfo merged in.
+    """
+    files = chunk_files(data_dir, ids, bounds)
+    with telemetry.span("query_chunks", files=len(files)):
+        frame = read_chunks(files, workers, on_warning)
+    if frame.empty:
+        return frame
+    if ids is not None and 'Name' in frame.columns:
+        frame = frame[frame['Name'].isin(set(ids))]
+    if bounds is not None:
+        frame = frame.iloc[frame.sindex.query(shapely.box(*bounds))].sort_index()
+    return frame
+
+
+def load_originals(paths, on_error=print, on_warning=print):
+    """
+    Loads the Originals GeoJSON merged with its attribute JSON, or None if missing.
+    """
+    # GeoJSON
+    path_orig_geo = paths["orig_geo"]
+    if not os.path.exists(path_orig_geo):
+        on_error(f"Archivo no encontrado: {path_orig_geo}")
+        return None
+
+    gdf_orig = gpd.read_file(path_orig_geo)
+
+    # Attributes
+    path_orig_attr = paths["orig_attr"]
+    if os.path.exists(path_orig_attr):
+        df_orig_attr = pd.read_json(path_orig_attr)
+        # Merge on Codrnap
+        if 'Codrnap' in gdf_orig.columns and 'Codrnap' in df_orig_attr.columns:
+            # Only merge columns that are not already in gdf_orig (except key)
+            cols_to_use = df_orig_attr.columns.difference(gdf_orig.columns).tolist()
+            cols_to_use.append('Codrnap')
+            gdf_orig = gdf_orig.merge(df_orig_attr[cols_to_use], on='Codrnap', how='left')
+    else:
+        on_warning("No se encontró el archivo de atributos de Sitios Originales")
+
+    return gdf_orig
+
+
+def read_prop_attributes(paths):
+    path_prop_attr = paths["prop_attr"]
+    if os.path.exists(path_prop_attr):
+        return pd.read_json(path_prop_attr)
+    return None
+
+
+def complete_proposed(gdf_chunk, df_prop_attr, kmz_descriptions):
+    """
+    Adds the attribute JSON columns and the KMZ PopupInfo to one chunk's rows.
+    Rows only depend on their own chunk, which is what lets refresh_store
+    patch a single chunk into the store.
+    """
+    # Attributes Proposed
+    if df_prop_attr is not None:
+        # Merge on Name
+        if 'Name' in gdf_chunk.columns and 'Name' in df_prop_attr.columns:
+            # Only merge columns that are not already in gdf_chunk (except key)
+            cols_to_use_p = df_prop_attr.columns.difference(gdf_chunk.columns).tolist()
+            cols_to_use_p.append('Name')
+            gdf_chunk = gdf_chunk.merge(df_prop_attr[cols_to_use_p], on='Name', how='left')
+
+    # Apply KMZ descriptions (PopupInfo recovery)
+    if kmz_descriptions and 'Name' in gdf_chunk.columns:
+        # We assume 'Name' maps to the Placemark name
+        # If 'PopupInfo' exists and is empty/null, we fill it. If it doesn't exist, we create it.
+        if 'PopupInfo' not in gdf_chunk.columns:
+            gdf_chunk['PopupInfo'] = None
+
+        # Coalesce: Use KMZ if valid, else keep existing (no duplicate column kept)
+        gdf_chunk['PopupInfo'] = gdf_chunk['Name'].map(kmz_descriptions).fillna(gdf_chunk['PopupInfo'])
+
+    return gdf_chunk
+
+
+def proposed_frames(files, df_prop_attr, kmz_descriptions, workers=None, on_warning=print):
+    """
+    Reads the given chunks and completes their rows; one frame per file
+    (None for chunks that failed to load).
+    """
+    with telemetry.span("read_chunks", files=len(files)) as sp:
+        chunks = read_chunk_frames(files, workers, on_warning)
+        sp.set(bytes=sum(os.path.getsize(f) for f in files if os.path.exists(f)))
+
+    with telemetry.span("merge_attributes") as sp:
+        frames = [
+            None if gdf_chunk is None or gdf_chunk.empty
+            else complete_proposed(gdf_chunk, df_prop_attr, kmz_descriptions)
+            for gdf_chunk in chunks
+        ]
+        sp.set(rows=sum(len(f) for f in frames if f is not None))
+    return frames
+
+
+def _load_sources(data_dir, on_error, on_warning, workers):
+    # (gdf_orig, chunk files, per-chunk frames, KMZ descriptions per file)
+    paths = source_paths(data_dir)
+
+    # --- Load Originals ---
+    with telemetry.span("load_originals"):
+        gdf_orig = load_originals(paths, on_error, on_warning)
+    if gdf_orig is None:
+        return None, None, None, None
+
+    # --- Load Proposed (Chunks) ---
+    files = paths["chunks"]
+    if not files:
+        on_error(f"No se encontraron chunks de datos propuestos en {os.path.join(data_dir, 'chunks')}/")
+        return gdf_orig, None, None, None
+
+    # --- Load KMZ Descriptions (PopupInfo recovery) ---
+    kmz_sets = kmz_description_sets(paths["kmz"])
+
+    frames = proposed_frames(files, read_prop_attributes(paths), merge_descriptions(kmz_sets),
+                             workers, on_warning)
+    return gdf_orig, files, frames, kmz_sets
+
+
+def load_sources(data_dir=DATA_DIR, on_error=print, on_warning=print, workers=None):
+    """
+    Loads and merges the raw sources (Originals and Proposed).
+    Handles chunk loading for Proposed sites (workers concurrent reads,
+    CHUNK_WORKERS by default).
+    Problems are reported through on_error / on_warning (st.error / st.warning in the app).
+    """
+    gdf_orig, _, frames, _ = _load_sources(data_dir, on_error, on_warning, workers)
+    if frames is None:
+        return gdf_orig, None
+    return gdf_orig, concat_frames(frames)
+
+
+# -----------------------------------------------------------------------------
+# GEOPARQUET STORE
+# -----------------------------------------------------------------------------
+def write_geometry_blob(geometries, path, append=False):
+    """
+    Writes geometries back to back as WKB (after the existing ones if append).
+    Returns (offsets, lengths); missing geometries get offset -1.
+    """
+    offsets = []
+    lengths = []
+    with open(path, 'ab' if append else 'wb') as f:
+        for wkb in shapely.to_wkb(geometries.values):
+            if wkb is None:
+                offsets.append(-1)
+                lengths.append(0)
+                continue
+            offsets.append(f.tell())
+            lengths.append(len(wkb))
+            f.write(wkb)
+    return offsets, lengths
+
+
+_HEAD_RE = re.compile(r'<head\b.*?</head>\s*', re.IGNORECASE | re.DOTALL)
+
+
+def compact_popup(html):
+    """
+    Strips the <head> boilerplate that the KMZ's XSLT adds to every PopupInfo.
+    """
+    return _HEAD_RE.sub('', html, count=1)
+
+
+def write_popup_blob(texts, path, append=False):
+    """
+    Writes every non-empty PopupInfo as a zlib-compressed entry (after the
+    existing ones if append).
+    Returns (offsets, lengths); missing values get offset -1.
+    """
+    offsets = []
+    lengths = []
+    with open(path, 'ab' if append else 'wb') as f:
+        for text in texts:
+            if not isinstance(text, str) or not text:
+                offsets.append(-1)
+                lengths.append(0)
+                continue
+            data = zlib.compress(compact_popup(text).encode('utf-8'), 9)
+            offsets.append(f.tell())
+            lengths.append(len(data))
+            f.write(data)
+    return offsets, lengths
+
+
+def _store_rows(gdf, kind, out_dir, generation, append=False):
+    # Writes the blobs of gdf's rows (geometry pyramid, and PopupInfo for the
+    # proposed sites) and returns a copy carrying their index and bbox columns
+    gdf = gdf.copy()
+    for level in PYRAMID_LEVELS:
+        geometries = gpd.GeoSeries(geometry_pyramid.simplify(gdf.geometry.values, level))
+        path = os.path.join(out_dir, blob_file(geom_file(kind, level), generation))
+        offsets, lengths = write_geometry_blob(geometries, path, append)
+        offset_col, length_col = index_columns(level)
+        gdf[offset_col] = offsets
+        gdf[length_col] = lengths
+    gdf[BBOX_COLUMNS] = gdf.geometry.bounds.values
+    if kind == "prop" and 'PopupInfo' in gdf.columns:
+        path = os.path.join(out_dir, blob_file(POPUP_FILE, generation))
+        offsets, lengths = write_popup_blob(gdf['PopupInfo'], path, append)
+        gdf[POPUP_COLUMNS[0]] = offsets
+        gdf[POPUP_COLUMNS[1]] = lengths
+        gdf = gdf.drop(columns=['PopupInfo'])
+    gdf[GENERATION_COLUMN] = generation
+    return gdf
+
+
+def _remove_old_blobs(out_dir, generation):
+    # Keeps the blobs of this generation and the previous one, which frames
+    # loaded before the build may still be reading
+    names = [POPUP_FILE] + [geom_file(kind, level) for kind in GEOM_FILES for level in PYRAMID_LEVELS]
+    keep = {blob_file(name, g) for name in names for g in (generation, generation - 1)}
+    for path in glob.glob(os.path.join(out_dir, '*')):
+        name = os.path.basename(path)
+        base = _GENERATION_RE.sub(r'\2', name)
+        if base in names and name not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                # Still open on Windows: removed by the next build
+                pass
+
+
+def _write_parquet(df, path):
+    # Replaced atomically: the app may be memory-mapping the previous file
+    tmp = path + '.tmp'
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def store_lock(data_dir=DATA_DIR):
+    """
+    Exclusive inter-process lock on the store, held while it is written.
+    Blocks until any other writer is done.
+    """
+    out_dir = store_dir(data_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, LOCK_FILE), 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 s
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_meta(data_dir, generation, crs, sources, chunk_rows, kmz_names):
+    # Build state: what the store was built from, and which rows each source produced
+    meta = {
+        "version": STORE_VERSION,
+        "generation": generation,
+        "crs": crs,
+        "sources": sources,
+        "chunk_rows": chunk_rows,
+        "kmz_names": kmz_names,
+    }
+    # Replaced atomically, like the parquet files: a torn meta would pass for
+    # a store built from unknown sources
+    path = os.path.join(store_dir(data_dir), META_FILE)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, path)
+
+
+def build_store(data_dir=DATA_DIR, workers=None):
+    """
+    Merges the raw sources and writes them to the GeoParquet store,
+    together with the per-site geometry blobs of every pyramid level, the
+    PopupInfo blob, the original/proposed comparison metrics and the spatial
+    matches (compare_sites.py).
+    Returns True if the store was written.
+    """
+    with store_lock(data_dir):
+        return _build_store(data_dir, workers)
+
+
+def _build_store(data_dir, workers):
+    gdf_orig, files, frames, kmz_sets = _load_sources(data_dir, print, print, workers)
+    if gdf_orig is None or frames is None:
+        return False
+    gdf_prop = concat_frames(frames)
+
+    out_dir = store_dir(data_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    generation = (read_meta(data_dir) or {}).get("generation", 0) + 1
+
+    crs = {}
+    for kind, gdf in (("orig", gdf_orig), ("prop", gdf_prop)):
+        gdf = _store_rows(gdf, kind, out_dir, generation)
+        _write_parquet(gdf, os.path.join(out_dir, STORE_FILES[kind]))
+        crs[kind] = gdf.crs.to_string() if gdf.crs is not None else None
+
+    comparison = compare_sites.compare_sites(gdf_orig, gdf_prop)
+    _write_parquet(comparison, os.path.join(out_dir, COMPARISON_FILE))
+    matches = compare_sites.match_sites(gdf_orig, gdf_prop)
+    _write_parquet(matches, os.path.join(out_dir, MATCH_FILE))
+
+    # Written last: a store without meta is treated as missing
+    _write_meta(
+        data_dir, generation, crs, source_fingerprint(data_dir),
+        chunk_rows={
+            os.path.relpath(f, data_dir): 0 if frame is None else len(frame)
+            for f, frame in zip(files, frames)
+        },
+        kmz_names={os.path.relpath(p, data_dir): sorted(d) for p, d in kmz_sets.items()},
+    )
+    _remove_old_blobs(out_dir, generation)
+
+    write_snapshot(data_dir)
+
+    print(f"Store written to {out_dir} ({len(gdf_orig)} originales, {len(gdf_prop)} propuestos)")
+    return True
+
+
+def _store_complete(data_dir, meta):
+    # Every file of the store, with the blobs of the generation in meta
+    generation = meta.get("generation")
+    if generation is None:
+        return False
+    out_dir = store_dir(data_dir)
+    names = list(STORE_FILES.values()) + [COMPARISON_FILE, MATCH_FILE, blob_file(POPUP_FILE, generation)]
+    names += [blob_file(geom_file(kind, level), generation) for kind in GEOM_FILES for level in PYRAMID_LEVELS]
+    return all(os.path.exists(os.path.join(out_dir, name)) for name in names)
+
+
+def _changed_sources(data_dir, recorded):
+    # (current sources, sources added, modified or removed since the build)
+    current = [os.path.relpath(p, data_dir) for p in _existing_sources(data_dir)]
+    changed = {
+        p for p in current
+        if p not in recorded or not fingerprint_matches(os.path.join(data_dir, p), recorded[p])
+    }
+    return current, changed | (set(recorded) - set(current))
+
+
+def _refreshed_fingerprints(data_dir, current, changed, recorded):
+    # Unchanged files keep their recorded hash, only their stat is updated
+    sources = {}
+    for p in current:
+        path = os.path.join(data_dir, p)
+        if p in changed:
+            sources[p] = file_fingerprint(path)
+        else:
+            stat = os.stat(path)
+            sources[p] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": recorded[p]["sha1"]}
+    return sources
+
+
+def refresh_store(data_dir=DATA_DIR, workers=None, on_warning=print, rebuild=True):
+    """
+    Brings the store up to date with the sources, touching only what changed.
+
+    The build state in the store metadata (fingerprint of every source, rows
+    produced by each chunk, names described by each KMZ) tells which sources
+    changed. Only changed chunks are re-read; their rows, and the rows whose
+    PopupInfo comes from a changed KMZ, are patched into the store: their
+    geometries and PopupInfo are appended to the blobs, and the comparison
+    metrics and spatial matches are recomputed for those sites only. Superseded blob entries are
+    left in place until the next full build (python site_store.py --full),
+    which writes compacted blobs under a new generation.
+
+    Changes to the Originals or the attribute JSONs affect every row and run
+    a full build_store instead, as does a missing or outdated store (with
+    rebuild=False, False is returned in those cases).
+    Runs under store_lock, so concurrent refreshes patch the store one after
+    the other (the later ones usually find nothing left to do).
+    Returns True if the store is up to date.
+    """
+    with store_lock(data_dir):
+        return _refresh_store(data_dir, workers, on_warning, rebuild)
+
+
+def _arrow_rows(gdf):
+    # Store rows as an Arrow table, with the geometry as WKB like the store
+    return pa.Table.from_pandas(pd.DataFrame(gdf.to_wkb()), preserve_index=False)
+
+
+def _arrow_names(table):
+    # Proposal names in an Arrow slice of the store
+    if table is None or 'Name' not in table.column_names:
+        return set()
+    return set(table.column('Name').drop_null().to_pylist())
+
+
+def _arrow_frame(table, crs):
+    # Decodes the WKB geometry of (a few) Arrow store rows
+    df = table.to_pandas()
+    df['geometry'] = shapely.from_wkb(df['geometry'].to_numpy())
+    return gpd.GeoDataFrame(df, geometry='geometry', crs=crs)
+
+
+def _write_arrow(table, path, schema):
+    # Written with the GeoParquet metadata of the file it replaces; the
+    # column bbox and geometry types no longer hold for the patched rows
+    metadata = dict(schema.metadata or {})
+    metadata.pop(b'pandas', None)
+    if b'geo' in metadata:
+        geo = json.loads(metadata[b'geo'])
+        for column in geo.get("columns", {}).values():
+            column.pop("bbox", None)
+            column["geometry_types"] = []
+        metadata[b'geo'] = json.dumps(geo).encode('utf-8')
+    tmp = path + '.tmp'
+    pq.write_table(table.replace_schema_metadata(metadata), tmp)
+    os.replace(tmp, path)
+
+
+def _candidate_originals(data_dir, geometries, crs):
+    # Stored original rows of every site whose bbox meets one of the given
+    # geometries, from an STRtree over the bbox columns (no geometry is read)
+    out_dir = store_dir(data_dir)
+    index = pd.read_parquet(os.path.join(out_dir, STORE_FILES["orig"]),
+                            columns=['Codrnap', GENERATION_COLUMN] + index_columns(0) + BBOX_COLUMNS)
+    orig_crs = (read_meta(data_dir) or {}).get("crs", {}).get("orig")
+    geometries = geometries[geometries.notna() & ~geometries.is_empty]
+    if orig_crs is not None and geometries.crs is not None and geometries.crs != orig_crs:
+        geometries = geometries.to_crs(orig_crs)
+    tree, positions = bbox_index(index)
+    _, hits = tree.query(shapely.box(*geometries.bounds.to_numpy().T))
+    # All rows of those sites: their matched share is over the whole site
+    codes = set(index['Codrnap'].iloc[positions[hits]].dropna())
+    return index[index['Codrnap'].isin(codes)]
+
+
+def _refresh_store(data_dir, workers, on_warning, rebuild):
+    meta = read_meta(data_dir)
+    if meta is None or meta.get("version") != STORE_VERSION or not _store_complete(data_dir, meta):
+        return rebuild and _build_store(data_dir, workers)
+
+    generation = meta["generation"]
+    recorded = meta.get("sources", {})
+    current, changed = _changed_sources(data_dir, recorded)
+    if not changed:
+        return True
+
+    paths = source_paths(data_dir)
+    shared = {os.path.relpath(paths[role], data_dir) for role in ("orig_geo", "orig_attr", "prop_attr")}
+    if changed & shared:
+        return rebuild and _build_store(data_dir, workers)
+
+    out_dir = store_dir(data_dir)
+    chunk_paths = {os.path.relpath(p, data_dir): p for p in paths["chunks"]}
+    kmz_paths = {os.path.relpath(p, data_dir): p for p in paths["kmz"]}
+    prop_crs = meta.get("crs", {}).get("prop")
+
+    # Store rows by chunk (the store keeps the chunks' order), kept as Arrow:
+    # rows that are not patched are written back without decoding them
+    prop_path = os.path.join(out_dir, STORE_FILES["prop"])
+    store_table = pq.read_table(prop_path, memory_map=True)
+    old_parts = {}
+    start = 0
+    for chunk, count in meta.get("chunk_rows", {}).items():
+        old_parts[chunk] = store_table.slice(start, count)
+        start += count
+    if start != store_table.num_rows:
+        return rebuild and _build_store(data_dir, workers)
+
+    # Names whose PopupInfo may change: described before or now by a changed KMZ
+    kmz_sets = kmz_description_sets(list(kmz_paths.values()))
+    kmz_names = {os.path.relpath(p, data_dir): sorted(d) for p, d in kmz_sets.items()}
+    descriptions = merge_descriptions(kmz_sets)
+    described = set()
+    for kmz in changed & set(kmz_paths):
+        described.update(meta.get("kmz_names", {}).get(kmz, []))
+        described.update(kmz_names.get(kmz, []))
+
+    # Changed chunks are re-read, and so are chunks with a name no KMZ
+    # describes any more (its PopupInfo falls back to the chunk's own value)
+    reread = []
+    for chunk in chunk_paths:
+        part = old_parts.get(chunk)
+        if chunk in changed or part is None:
+            reread.append(chunk)
+        elif described and any(name not in descriptions for name in _arrow_names(part) & described):
+            reread.append(chunk)
+
+    frames = proposed_frames([chunk_paths[c] for c in reread], read_prop_attributes(paths),
+                             descriptions, workers, on_warning)
+    if any(frame is not None and frame.crs != prop_crs for frame in frames):
+        return rebuild and _build_store(data_dir, workers)
+    new_parts = {
+        chunk: None if frame is None else _store_rows(frame, "prop", out_dir, generation, append=True)
+        for chunk, frame in zip(reread, frames)
+    }
+
+    tables = []
+    chunk_rows = {}
+    for chunk in chunk_paths:
+        if chunk in new_parts:
+            part = None if new_parts[chunk] is None else _arrow_rows(new_parts[chunk])
+        else:
+            part = old_parts[chunk]
+            if _arrow_names(part) & described:
+                # Only this chunk's rows are decoded (geometry stays WKB)
+                df = part.to_pandas()
+                mask = df['Name'].isin(described)
+                offsets, lengths = write_popup_blob(df.loc[mask, 'Name'].map(descriptions),
+                                                    os.path.join(out_dir, blob_file(POPUP_FILE, generation)),
+                                                    append=True)
+                df.loc[mask, POPUP_COLUMNS[0]] = offsets
+                df.loc[mask, POPUP_COLUMNS[1]] = lengths
+                part = pa.Table.from_pandas(df, preserve_index=False)
+        chunk_rows[chunk] = 0 if part is None else part.num_rows
+        if part is not None and part.num_rows:
+            tables.append(part)
+    try:
+        prop_table = pa.concat_tables(tables, promote_options="permissive") if tables else store_table.slice(0, 0)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # The re-read chunks changed a column's type beyond promotion
+        return rebuild and _build_store(data_dir, workers)
+
+    # Comparison metrics of the sites whose geometry may have changed (or
+    # that are gone with a removed chunk)
+    touched = set()
+    for chunk in reread + [c for c in old_parts if c not in chunk_paths]:
+        touched |= _arrow_names(old_parts.get(chunk))
+        part = new_parts.get(chunk)
+        if part is not None and 'Name' in part.columns:
+            touched.update(part['Name'].dropna())
+    if touched:
+        # Current rows of those sites, wherever they are now
+        prop_touched = _arrow_frame(
+            prop_table.filter(pc.is_in(prop_table.column('Name'), value_set=pa.array(sorted(touched)))), prop_crs)
+
+        comparison = read_comparison(data_dir)
+        comparison = comparison[~comparison['Codrnap'].isin(touched)]
+        orig_rows = pd.read_parquet(os.path.join(out_dir, STORE_FILES["orig"]),
+                                    columns=['Codrnap', GENERATION_COLUMN] + index_columns(0),
+                                    filters=[('Codrnap', 'in', sorted(touched))])
+        patch = compare_sites.compare_sites(site_geometry(orig_rows, "orig", data_dir), prop_touched)
+        if not patch.empty:
+            comparison = pd.concat([comparison, patch], ignore_index=True)
+
+        # Spatial matches of those proposals, against the originals whose
+        # bbox they meet (the rest cannot overlap them)
+        matches = read_matches(data_dir)
+        matches = matches[~matches['Name'].isin(touched)]
+        candidates = _candidate_originals(data_dir, prop_touched.geometry, prop_crs)
+        patch = compare_sites.match_sites(site_geometry(candidates, "orig", data_dir), prop_touched)
+        if not patch.empty:
+            matches = pd.concat([matches, patch], ignore_index=True).sort_values(
+                ['Codrnap', 'inter_ha'], ascending=[True, False], ignore_index=True)
+    else:
+        comparison = None
+
+    _write_arrow(prop_table, prop_path, store_table.schema)
+    if comparison is not None:
+        _write_parquet(comparison, os.path.join(out_dir, COMPARISON_FILE))
+        _write_parquet(matches, os.path.join(out_dir, MATCH_FILE))
+    _write_meta(data_dir, generation, meta.get("crs", {}),
+                _refreshed_fingerprints(data_dir, current, changed, recorded), chunk_rows, kmz_names)
+    write_snapshot(data_dir)
+
+    print(f"Store refreshed in {out_dir} ({len(reread)} chunks re-read, {len(described)} PopupInfo updated)")
+    return True
+
+
+def read_meta(data_dir=DATA_DIR):
+    """
+    Returns the store metadata, or None if it is missing or unreadable.
+    """
+    try:
+        with open(os.path.join(store_dir(data_dir), META_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_store_fresh(data_dir=DATA_DIR):
+    """
+    Checks the store against the current sources (see fingerprint_matches).
+    """
+    meta = read_meta(data_dir)
+    if meta is None or meta.get("version") != STORE_VERSION or not _store_complete(data_dir, meta):
+        return False
+
+    _, changed = _changed_sources(data_dir, meta.get("sources", {}))
+    return not changed
+
+
+def read_store(data_dir=DATA_DIR, geometry=False):
+    """
+    Bulk-reads the store (memory-mapped). Returns (df_orig, df_prop).
+    By default only the attribute columns are read (plus the geometry index);
+    use site_geometry() to materialize a site. With geometry=True the full
+    GeoDataFrames are returned instead (offline stages).
+    """
+    out_dir = store_dir(data_dir)
+    frames = []
+    for kind in ("orig", "prop"):
+        path = os.path.join(out_dir, STORE_FILES[kind])
+        if geometry:
+            frames.append(gpd.read_parquet(path, memory_map=True))
+        else:
+            columns = [c for c in pq.read_schema(path).names if c != 'geometry']
+            frames.append(pd.read_parquet(path, columns=columns, memory_map=True))
+    return frames[0], frames[1]
+
+
+def read_comparison(data_dir=DATA_DIR):
+    """
+    Reads the precomputed comparison metrics (one row per Codrnap pair).
+    """
+    return pd.read_parquet(os.path.join(store_dir(data_dir), COMPARISON_FILE))
+
+
+def read_matches(data_dir=DATA_DIR):
+    """
+    Reads the spatial matches (one row per overlapping Codrnap/Name pair).
+    """
+    return pd.read_parquet(os.path.join(store_dir(data_dir), MATCH_FILE))
+
+
+def read_popup(offset, length, generation, data_dir=DATA_DIR):
+    """
+    Reads and decompresses one PopupInfo entry from the blob of the given generation.
+    """
+    if offset < 0:
+        return None
+    with open(os.path.join(store_dir(data_dir), blob_file(POPUP_FILE, generation)), 'rb') as f:
+        f.seek(offset)
+        return zlib.decompress(f.read(length)).decode('utf-8')
+
+
+def popup_info(row, data_dir=DATA_DIR):
+    """
+    PopupInfo HTML of a proposed row: from the frame itself (raw source
+    fallback) or fetched on demand from the store's blob. None if empty.
+    """
+    if 'PopupInfo' in row:
+        return row['PopupInfo'] or None
+    if POPUP_COLUMNS[0] in row and not pd.isna(row[POPUP_COLUMNS[0]]):
+        return read_popup(int(row[POPUP_COLUMNS[0]]), int(row[POPUP_COLUMNS[1]]), int(row[GENERATION_COLUMN]),
+                          data_dir)
+    return None
+
+
+def read_geometry(kind, offset, length, generation, data_dir=DATA_DIR, level=0):
+    """
+    Reads a single geometry from the WKB blob of the given kind, generation
+    and pyramid level.
+    """
+    if offset < 0:
+        return None
+    with open(os.path.join(store_dir(data_dir), blob_file(geom_file(kind, level), generation)), 'rb') as f:
+        f.seek(offset)
+        return shapely.from_wkb(f.read(length))
+
+
+def site_geometry(rows, kind, data_dir=DATA_DIR, level=0):
+    """
+    Returns the given attribute rows as a GeoDataFrame, reading their
+    geometry at the given pyramid level from the blob. Frames that already
+    carry a geometry (raw source fallback) are simplified on the fly.
+    """
+    if isinstance(rows, gpd.GeoDataFrame):
+        if level == 0:
+            return rows
+        return rows.set_geometry(geometry_pyramid.simplify(rows.geometry.values, level), crs=rows.crs)
+
+    offset_col, length_col = index_columns(level)
+    # Rows read together from the store share their generation
+    generation = int(rows[GENERATION_COLUMN].iloc[0]) if len(rows) else None
+    geoms = read_geometries(kind, rows[offset_col].to_numpy(), rows[length_col].to_numpy(), generation,
+                            data_dir, level)
+    crs = (read_meta(data_dir) or {}).get("crs", {}).get(kind)
+    return gpd.GeoDataFrame(rows, geometry=geoms, crs=crs)
+
+
+def read_geometries(kind, offsets, lengths, generation, data_dir=DATA_DIR, level=0):
+    """
+    Reads several geometries from the WKB blob of a generation with a single
+    open, in file order. Returns a shapely array aligned with offsets (None
+    where < 0).
+    """
+    wkbs = np.full(len(offsets), None, dtype=object)
+    if len(offsets) == 0:
+        return wkbs
+    with open(os.path.join(store_dir(data_dir), blob_file(geom_file(kind, level), generation)), 'rb') as f:
+        for i in np.argsort(offsets, kind='stable'):
+            if offsets[i] < 0:
+                continue
+            f.seek(int(offsets[i]))
+            wkbs[i] = f.read(int(lengths[i]))
+    return shapely.from_wkb(wkbs)
+
+
+def site_points(rows, kind, data_dir=DATA_DIR):
+    """
+    The given rows as points at the center of their bounding box, for maps
+    showing too many sites to draw their outlines.
+    """
+    bounds = row_bounds(rows)
+    points = shapely.points((bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2)
+    if isinstance(rows, gpd.GeoDataFrame):
+        return rows.set_geometry(points, crs=rows.crs)
+    crs = (read_meta(data_dir) or {}).get("crs", {}).get(kind)
+    return gpd.GeoDataFrame(rows, geometry=points, crs=crs)
+
+
+def row_bounds(rows):
+    """
+    (n x 4) minx, miny, maxx, maxy of every row, from its geometry or the
+    stored bbox columns (NaN without geometry).
+    """
+    if isinstance(rows, gpd.GeoDataFrame):
+        return rows.geometry.bounds.to_numpy(dtype=float)
+    if all(c in rows.columns for c in BBOX_COLUMNS):
+        return rows[BBOX_COLUMNS].to_numpy(dtype=float)
+    return np.full((len(rows), 4), np.nan)
+
+
+def bbox_index(frame):
+    """
+    (STRtree over the rows' bounding boxes, row position of each tree item).
+    Rows without geometry are left out.
+    """
+    bounds = row_bounds(frame)
+    positions = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+    return shapely.STRtree(shapely.box(*bounds[positions].T)), positions
+
+
+def site_bounds(*frames):
+    """
+    Combined (minx, miny, maxx, maxy) of the given rows, from their geometry
+    or from the stored bbox columns. None if there are no rows.
+    """
+    boxes = []
+    for rows in frames:
+        if rows.empty:
+            continue
+        if isinstance(rows, gpd.GeoDataFrame):
+            boxes.append(rows.total_bounds)
+        else:
+            boxes.append([
+                rows['bbox_minx'].min(), rows['bbox_miny'].min(),
+                rows['bbox_maxx'].max(), rows['bbox_maxy'].max(),
+            ])
+    if not boxes:
+        return None
+    return (
+        min(b[0] for b in boxes), min(b[1] for b in boxes),
+        max(b[2] for b in boxes), max(b[3] for b in boxes),
+    )
+
+
+# -----------------------------------------------------------------------------
+# SHARED DATA
+# -----------------------------------------------------------------------------
+class SiteData:
+    """
+    Immutable bundle of the loaded frames, built once per process and shared
+    by every session (app.py caches it with st.cache_resource, no copies).
+    Callers must treat the frames as read-only and derive new frames instead
+    of adding columns or assigning in place.
+
+    The selectbox options and the site ID -> row positions index of both
+    frames are built here, once, so a site switch is a dict lookup.
+    comparison holds the precomputed geometric metrics (None without a store);
+    matches the spatial matches between both frames, indexed by either code.
+    The national overview table and its sort orders are precomputed as well,
+    and so is a bounding-box spatial index of each frame for viewport queries.
+    """
+    __slots__ = ('_orig', '_prop', '_version', '_options', '_option_ids', '_positions',
+                 '_comparison', '_matches', '_match_positions', '_overview', '_orders', '_bbox_index')
+
+    def __init__(self, orig, prop, version, comparison=None, matches=None):
+        options, option_ids = selection_options(orig)
+        positions = {
+            "orig": row_positions(orig, KEY_COLUMNS["orig"]),
+            "prop": row_positions(prop, KEY_COLUMNS["prop"]),
+        }
+        if comparison is not None:
+            comparison = comparison.drop_duplicates('Codrnap').set_index('Codrnap')
+        if matches is None:
+            matches = pd.DataFrame(columns=compare_sites.MATCH_COLUMNS)
+        match_positions = {
+            "orig": row_positions(matches, "Codrnap"),
+            "prop": row_positions(matches, "Name"),
+        }
+        overview = build_overview(orig, prop, comparison)
+        orders = overview_orders(overview)
+        bbox = {"orig": bbox_index(orig), "prop": bbox_index(prop)}
+        for name, value in (('_orig', orig), ('_prop', prop), ('_version', version),
+                            ('_options', options), ('_option_ids', option_ids),
+                            ('_positions', positions), ('_comparison', comparison),
+                            ('_matches', matches), ('_match_positions', match_positions),
+                            ('_overview', overview), ('_orders', orders), ('_bbox_index', bbox)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SiteData is read-only")
+
+    @property
+    def orig(self):
+        return self._orig
+
+    @property
+    def prop(self):
+        return self._prop
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def options(self):
+        """
+        Sorted "Codrnap (NombreOrig)" labels, or None if the columns are missing.
+        """
+        return self._options
+
+    def site_id(self, option):
+        return self._option_ids[option]
+
+    def rows(self, kind, site_id):
+        """
+        Rows of the 'orig' or 'prop' frame for a site ID, or a list of IDs
+        (possibly empty).
+        """
+        frame = self._orig if kind == "orig" else self._prop
+        positions = self._positions[kind]
+        if isinstance(site_id, (list, tuple)):
+            return frame.take([p for s in site_id for p in positions.get(s, [])])
+        return frame.take(positions.get(site_id, []))
+
+    def matches(self, kind, site_id):
+        """
+        Spatial matches (compare_sites.MATCH_COLUMNS) of an 'orig' (Codrnap)
+        or 'prop' (Name) site ID, largest overlap first. Includes the pair
+        with the same code when both overlap.
+        """
+        matches = self._matches.take(self._match_positions[kind].get(site_id, []))
+        return matches.sort_values('inter_ha', ascending=False, kind='stable')
+
+    def comparison(self, site_id):
+        """
+        Comparison metrics of a site as a dict (compare_sites.COLUMNS), or None.
+        """
+        if self._comparison is None or site_id not in self._comparison.index:
+            return None
+        return self._comparison.loc[site_id].to_dict()
+
+    def in_view(self, kind, bounds):
+        """
+        Rows of the 'orig' or 'prop' frame whose bounding box intersects
+        bounds (minx, miny, maxx, maxy), from the bbox spatial index.
+        """
+        tree, positions = self._bbox_index[kind]
+        hits = np.sort(positions[tree.query(shapely.box(*bounds))])
+        frame = self._orig if kind == "orig" else self._prop
+        return frame.take(hits)
+
+    @property
+    def zones(self):
+        """
+        Sorted macro zones (FolderPath) present in the overview.
+        """
+        return sorted(self._overview['FolderPath'].dropna().unique())
+
+    def overview_query(self, sort_by='delta_has', ascending=False, zones=None, query=''):
+        """
+        Filters and sorts the overview on the server, using the precomputed
+        sort orders. Returns the matching row positions in display order.
+        """
+        overview = self._overview
+        mask = np.ones(len(overview), dtype=bool)
+        if zones:
+            mask &= overview['FolderPath'].isin(zones).to_numpy()
+        if query:
+            mask &= overview['_search'].str.contains(query.lower(), regex=False).to_numpy()
+
+        order = self._orders[(sort_by, ascending)]
+        return order[mask[order]]
+
+    def overview_rows(self, positions):
+        """
+        Overview rows at the given positions (e.g. one page of overview_query).
+        """
+        return self._overview.iloc[positions].drop(columns=['_search'])
+
+
+# Overview columns that can be sorted on (precomputed orders)
+OVERVIEW_SORT_KEYS = ['delta_has', 'abs_delta_has', 'delta_perim_km', 'FolderPath', 'iou', 'Codrnap']
+
+
+def build_overview(orig, prop, comparison=None):
+    """
+    One row per original site with the proposed attributes and deltas
+    (proposed - original), plus IoU when comparison metrics are available.
+    """
+    o = orig.reindex(columns=['Codrnap', 'NombreOrig', 'Has', 'Perim_km'])
+    p = prop.reindex(columns=['Name', 'FolderPath', 'Has', 'Perim_km'])
+    o = o[o['Codrnap'].notna()].drop_duplicates('Codrnap')
+    p = p[p['Name'].notna()].drop_duplicates('Name')
+
+    overview = o.merge(p, left_on='Codrnap', right_on='Name', how='left', suffixes=('_orig', '_prop'))
+    overview = overview.drop(columns=['Name']).reset_index(drop=True)
+    overview['delta_has'] = overview['Has_prop'] - overview['Has_orig']
+    overview['abs_delta_has'] = overview['delta_has'].abs()
+    overview['delta_perim_km'] = overview['Perim_km_prop'] - overview['Perim_km_orig']
+    if comparison is not None:
+        overview['iou'] = overview['Codrnap'].map(comparison['iou'])
+    else:
+        overview['iou'] = np.nan
+    overview['_search'] = (overview['Codrnap'].astype(str) + ' ' + overview['NombreOrig'].fillna('').astype(str)).str.lower()
+    return overview
+
+
+def overview_orders(overview):
+    """
+    {(column, ascending): row positions} for every sort key, missing values last.
+    """
+    orders = {}
+    for key in OVERVIEW_SORT_KEYS:
+        for ascending in (True, False):
+            ordered = overview.sort_values(key, ascending=ascending, na_position='last', kind='stable')
+            orders[(key, ascending)] = overview.index.get_indexer(ordered.index)
+    return orders
+
+
+def row_positions(frame, column):
+    """
+    {value: array of row positions} for a key column ({} if it is missing).
+    """
+    if column not in frame.columns:
+        return {}
+    return frame.groupby(column, sort=False).indices
+
+
+def selection_options(orig):
+    """
+    Returns (sorted labels, {label: Codrnap}) for the site selectbox,
+    or (None, {}) if the Originals lack 'Codrnap' or 'NombreOrig'.
+    """
+    if 'NombreOrig' not in orig.columns or 'Codrnap' not in orig.columns:
+        return None, {}
+    valid = orig[orig['Codrnap'].notna()]
+    codes = valid['Codrnap'].astype(str)
+    labels = codes + ' (' + valid['NombreOrig'].fillna('').astype(str) + ')'
+    option_ids = dict(zip(labels, codes))
+    return tuple(sorted(option_ids)), option_ids
+
+
+# Headline metrics of every site kept in the warm-state snapshot
+SNAPSHOT_METRICS = ['Has_orig', 'Has_prop', 'Perim_km_orig', 'Perim_km_prop', 'iou']
+
+
+def write_snapshot(data_dir=DATA_DIR):
+    """
+    Writes the warm-state snapshot (warm_start.py) from the store: selectbox
+    options, site IDs and the SNAPSHOT_METRICS of every original site.
+    """
+    df_orig, df_prop = read_store(data_dir)
+    options, option_ids = selection_options(df_orig)
+    if options is None:
+        return
+    comparison = read_comparison(data_dir).drop_duplicates('Codrnap').set_index('Codrnap')
+    overview = build_overview(df_orig, df_prop, comparison)
+    metrics = overview.set_index(overview['Codrnap'].astype(str))[SNAPSHOT_METRICS]
+    metrics = metrics.astype(object).where(metrics.notna(), None).to_dict('index')
+    warm_start.write_snapshot(options, option_ids, metrics,
+                              list(STORE_FILES.values()) + [COMPARISON_FILE], data_dir)
+
+
+def data_signature(data_dir=DATA_DIR):
+    """
+    Cheap signature (size and mtime of every source and store file) that
+    changes whenever the data on disk changes. Used as the shared cache key.
+    """
+    out_dir = store_dir(data_dir)
+    files = _existing_sources(data_dir)
+    files += [os.path.join(out_dir, name) for name in list(STORE_FILES.values()) + [COMPARISON_FILE, META_FILE]]
+    h = hashlib.sha1()
+    for path in files:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            h.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode('utf-8'))
+    return h.hexdigest()
+
+
+def refresh_if_stale(data_dir=DATA_DIR, workers=None, on_warning=print):
+    """
+    Patches an existing store that no longer matches its sources (see
+    refresh_store). Returns True if the store is fresh afterwards, False if
+    there is no store or it could not be refreshed.
+    """
+    if is_store_fresh(data_dir):
+        return True
+    if read_meta(data_dir) is None:
+        return False
+    try:
+        with telemetry.span("refresh_store"):
+            return refresh_store(data_dir, workers, on_warning, rebuild=False)
+    except OSError:
+        # Read-only deployment: serve the raw sources
+        return False
+
+
+def load_site_data(data_dir=DATA_DIR, on_error=print, on_warning=print, workers=None):
+    """
+    Loads the frames for the app: the store's attribute tables when it is
+    fresh (an existing store is first patched with whatever sources changed,
+    see refresh_if_stale), the raw sources otherwise. Returns a SiteData, or
+    None on error.
+    """
+    fresh = refresh_if_stale(data_dir, workers, on_warning)
+    # After the refresh, which rewrites store files: the version must match
+    # what data_signature returns from now on
+    version = data_signature(data_dir)
+    if fresh:
+        with telemetry.span("read_store") as sp:
+            df_orig, df_prop = read_store(data_dir)
+            comparison = read_comparison(data_dir)
+            matches = read_matches(data_dir)
+            sp.set(rows=len(df_prop), bytes=sum(
+                os.path.getsize(os.path.join(store_dir(data_dir), name))
+                for name in list(STORE_FILES.values()) + [COMPARISON_FILE, MATCH_FILE]
+            ))
+        return SiteData(df_orig, df_prop, version, comparison, matches)
+
+    df_orig, df_prop = load_sources(data_dir, on_error=on_error, on_warning=on_warning, workers=workers)
+    if df_orig is None or df_prop is None:
+        return None
+    with telemetry.span("match_sites", rows=len(df_prop)):
+        matches = compare_sites.match_sites(df_orig, df_prop)
+    return SiteData(df_orig, df_prop, version, matches=matches)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--full" in sys.argv[1:]:
+        built = build_store(DATA_DIR)
+    else:
+        built = refresh_store(DATA_DIR)
+    if not built:
+        print("Error: store not built, see messages above.")
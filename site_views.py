@@ -0,0 +1,70 @@
+"""
+Site view helpers shared by the app, the static bundles (site_bundles.py)
+and the HTTP API (site_api.py): the attribute tables, metrics and metric
+HTML a site page shows. Imports neither folium nor the export machinery.
+"""
+import pandas as pd
+
+import site_store
+
+
+def metric_html(label, value, unit, delta_val=None):
+    """
+    HTML of a metric with 50% reduced size and inline delta (app.render_metric).
+    """
+    delta_html = ""
+    if delta_val is not None:
+        color = "green" if delta_val >= 0 else "red"
+        sign = "+" if delta_val > 0 else ""
+        delta_html = f"<span style='color:{color}; font-size: 0.8em; margin-left: 5px;'>({sign}{delta_val:,.2f})</span>"
+
+    return f"""
+    <div style="margin-bottom: 10px;">
+        <div style="font-size: 0.8rem; color: #888;">{label}</div>
+        <div style="font-size: 1.2rem; font-weight: bold;">
+            {value:,.2f} {unit} {delta_html}
+        </div>
+    </div>
+    """
+
+
+def attribute_table(site, extra_drop=()):
+    """
+    Attribute rows of a site frame without geometry, store index and
+    duplicated '_attr' columns (as shown in the app).
+    """
+    cols_to_drop = ['geometry'] + site_store.INDEX_COLUMNS + list(extra_drop)
+    cols_to_drop += [c for c in site.columns if c.endswith('_attr')]
+    return pd.DataFrame(site.drop(columns=[c for c in cols_to_drop if c in site.columns]))
+
+
+def json_records(df):
+    """
+    Rows of a frame as JSON-ready dicts (missing values as None).
+    """
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def _value(row, column):
+    value = row[column] if column in row else 0
+    return 0 if pd.isna(value) else float(value)
+
+
+def site_metrics(site_orig, site_prop, comparison=None):
+    """
+    The metrics of the site view: surface and perimeter of both versions,
+    deltas (proposed - original) and the precomputed geometric comparison.
+    """
+    metrics = {}
+    if not site_orig.empty:
+        metrics['Has_orig'] = _value(site_orig.iloc[0], 'Has')
+        metrics['Perim_km_orig'] = _value(site_orig.iloc[0], 'Perim_km')
+    if not site_prop.empty:
+        metrics['Has_prop'] = _value(site_prop.iloc[0], 'Has')
+        metrics['Perim_km_prop'] = _value(site_prop.iloc[0], 'Perim_km')
+        metrics['delta_has'] = metrics['Has_prop'] - metrics['Has_orig'] if 'Has_orig' in metrics else 0
+        metrics['delta_perim_km'] = metrics['Perim_km_prop'] - metrics['Perim_km_orig'] if 'Perim_km_orig' in metrics else 0
+        if comparison is not None:
+            for key, value in comparison.items():
+                metrics[key] = None if pd.isna(value) else float(value)
+    return metrics
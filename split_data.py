@@ -1,65 +1,292 @@
+import glob
+import hashlib
 import json
 import os
-import math
 
-def split_geojson(input_file, output_dir, max_size_mb=24):
+MANIFEST_FILE = "manifest.json"
+CHUNK_PREFIX = "sitios_propuestos_part"
+
+_decoder = json.JSONDecoder()
+
+
+class _JsonStream:
+    """
+    Minimal pull reader over a JSON text file.
+    Keeps only the unread tail of the file in memory, so a FeatureCollection can
+    be consumed one feature at a time (memory is bounded by the largest feature).
+    """
+
+    def __init__(self, f, block_size=1 << 20):
+        self.f = f
+        self.block_size = block_size
+        self.buf = ''
+        self.pos = 0
+        self.base = 0  # absolute character offset of buf[0]
+        self.eof = False
+
+    def _fill(self):
+        # Grow by at least the pending size so retries on a large value stay linear
+        pending = len(self.buf) - self.pos
+        block = self.f.read(max(self.block_size, pending))
+        if not block:
+            self.eof = True
+            return False
+        self.base += self.pos
+        self.buf = self.buf[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Returns the next non-whitespace character without consuming it ('' at EOF).
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}'")
+        self.pos += 1
+
+    def value(self):
+        """
+        Decodes the next JSON value, reading more of the file as needed.
+        """
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may continue in the next block
+                if end < len(self.buf) or self.eof or isinstance(obj, (dict, list, str)):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_geojson(input_file, members):
+    """
+    Streams the features of a GeoJSON FeatureCollection one at a time.
+    Yields (feature, raw_text, (start, end)) where start/end are absolute
+    character offsets of the raw text in the file.
+    Other top-level members (type, crs, name...) are stored in `members`
+    as they are found, so they are complete once the generator is exhausted.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f)
+        stream.expect('{')
+        while True:
+            char = stream.peek()
+            if char == ',':
+                stream.pos += 1
+                continue
+            if char == '}':
+                return
+            key = stream.value()
+            stream.expect(':')
+            if key != 'features':
+                members[key] = stream.value()
+                continue
+
+            stream.expect('[')
+            while True:
+                char = stream.peek()
+                if char == ',':
+                    stream.pos += 1
+                    continue
+                if char == ']':
+                    stream.pos += 1
+                    break
+                start = stream.base + stream.pos
+                feature = stream.value()
+                end = stream.base + stream.pos
+                yield feature, stream.buf[start - stream.base:end - stream.base], (start, end)
+
+
+def read_spans(input_file, spans, block_size=1 << 20):
+    """
+    Yields the text of each (start, end) character span, reading the file
+    sequentially. Spans must be sorted and non-overlapping.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        buf = ''
+        base = 0
+        for start, end in spans:
+            while base + len(buf) < end:
+                block = f.read(max(block_size, end - base - len(buf)))
+                if not block:
+                    raise ValueError(f"Unexpected end of file in {input_file}")
+                buf += block
+            yield buf[start - base:end - base]
+            buf = buf[end - base:]
+            base = end
+
+
+def feature_bbox(feature):
     """
-    Splits a GeoJSON file into smaller chunks based on a target size in MB.
+    Returns [minx, miny, maxx, maxy] of a GeoJSON feature, or None if it has no coordinates.
+    """
+    bbox = None
+
+    def walk(coords):
+        nonlocal bbox
+        if not coords:
+            return
+        if isinstance(coords[0], (int, float)):
+            coords = [coords]
+        elif not isinstance(coords[0][0], (int, float)):
+            for c in coords:
+                walk(c)
+            return
+        # List of positions (ring / line / multipoint)
+        xs, ys = list(zip(*coords))[:2]
+        bbox = merge_bbox(bbox, [min(xs), min(ys), max(xs), max(ys)])
+
+    geometry = feature.get('geometry') or {}
+    walk(geometry.get('coordinates') or [])
+    return bbox
+
+
+def merge_bbox(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def pack_features(sizes, capacity):
+    """
+    First-fit decreasing bin packing.
+    Returns a list of bins, each a list of feature indexes in input order.
+    Features larger than the capacity get a bin of their own.
+    """
+    bins = []
+    free = []
+    for idx in sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True):
+        for b, room in enumerate(free):
+            if sizes[idx] <= room:
+                bins[b].append(idx)
+                free[b] -= sizes[idx]
+                break
+        else:
+            bins.append([idx])
+            free.append(capacity - sizes[idx])
+    return [sorted(b) for b in bins]
+
+
+def split_geojson(input_file, output_dir, max_size_mb=5, id_field='Name'):
+    """
+    Splits a GeoJSON file into chunks of at most max_size_mb each.
+    The input is streamed twice (sizes first, then copying each feature's raw
+    text to its chunk), so memory stays bounded by the largest feature.
+    Writes a manifest.json next to the chunks with the feature IDs, bbox,
+    byte size and sha1 of every chunk.
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    print(f"Loading {input_file}...")
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # --- Pass 1: serialized size, ID and bbox of every feature ---
+    print(f"Scanning {input_file}...")
+    members = {}
+    sizes = []
+    spans = []
+    ids = []
+    bboxes = []
+    for feature, raw, span in iter_geojson(input_file, members):
+        sizes.append(len(raw.encode('utf-8')) + 2)  # + ", " separator
+        spans.append(span)
+        ids.append((feature.get('properties') or {}).get(id_field))
+        bboxes.append(feature_bbox(feature))
 
-    features = data.get('features', [])
-    total_features = len(features)
+    total_features = len(sizes)
     print(f"Total features found: {total_features}")
 
-    # Estimate size per feature to calculate chunks
-    file_size_mb = os.path.getsize(input_file) / (1024 * 1024)
-    print(f"File size: {file_size_mb:.2f} MB")
-    
-    # Aggressively split to ensure < 25MB. 
-    # Previous attempt with 5 chunks resulted in one 63MB chunk due to uneven feature sizes.
-    # Let's target 5MB per chunk average to be safe, which gives plenty of buffer.
-    target_chunk_mb = 5
-    num_chunks = math.ceil(file_size_mb / target_chunk_mb) 
-    
-    # Ensure at least 4 chunks as per prompt, but likely will be ~20
-    num_chunks = max(num_chunks, 4) 
-    
-    chunk_size = math.ceil(total_features / num_chunks)
-    print(f"Splitting into {num_chunks} chunks (approx {chunk_size} features each)...")
-
-    for i in range(num_chunks):
-        start_idx = i * chunk_size
-        end_idx = min((i + 1) * chunk_size, total_features)
-        
-        chunk_features = features[start_idx:end_idx]
-        
-        chunk_data = {
-            "type": "FeatureCollection",
-            "features": chunk_features,
-            # Preserve crs if present, though often standard GeoJSON is 4326 by default
-            "crs": data.get("crs") 
-        }
-        
-        output_filename = os.path.join(output_dir, f"sitios_propuestos_part{i+1}.geojson")
-        with open(output_filename, 'w', encoding='utf-8') as outfile:
-            json.dump(chunk_data, outfile)
-        
-        print(f"Saved {output_filename} ({len(chunk_features)} features)")
+    header = '{"type": "FeatureCollection", "features": ['
+    footer = '], "crs": ' + json.dumps(members.get('crs')) + '}'
+    capacity = int(max_size_mb * 1024 * 1024) - len(header) - len(footer)
+
+    bins = pack_features(sizes, capacity)
+    oversized = [ids[i] for i, size in enumerate(sizes) if size > capacity]
+    if oversized:
+        print(f"Warning: {len(oversized)} features exceed {max_size_mb} MB on their own: {oversized}")
+    print(f"Packing into {len(bins)} chunks (<= {max_size_mb} MB each)...")
+
+    # Remove chunks from previous runs so the directory matches the manifest
+    for old in glob.glob(os.path.join(output_dir, f"{CHUNK_PREFIX}*.geojson")):
+        os.remove(old)
+
+    # --- Pass 2: stream features into their assigned chunk ---
+    assignment = {}
+    for b, indexes in enumerate(bins):
+        for idx in indexes:
+            assignment[idx] = b
+
+    outputs = []
+    for b in range(len(bins)):
+        filename = f"{CHUNK_PREFIX}{b + 1}.geojson"
+        outputs.append({
+            "file": filename,
+            "handle": open(os.path.join(output_dir, filename), 'wb'),
+            "hash": hashlib.sha1(),
+            "bytes": 0,
+            "count": 0,
+        })
+
+    def write(out, text):
+        data = text.encode('utf-8')
+        out["handle"].write(data)
+        out["hash"].update(data)
+        out["bytes"] += len(data)
+
+    try:
+        for out in outputs:
+            write(out, header)
+        for idx, raw in enumerate(read_spans(input_file, spans)):
+            out = outputs[assignment[idx]]
+            write(out, (", " if out["count"] else "") + raw)
+            out["count"] += 1
+        for out in outputs:
+            write(out, footer)
+    finally:
+        for out in outputs:
+            out["handle"].close()
+
+    # --- Manifest ---
+    chunks = []
+    for b, out in enumerate(outputs):
+        bbox = None
+        for idx in bins[b]:
+            bbox = merge_bbox(bbox, bboxes[idx])
+        chunks.append({
+            "file": out["file"],
+            "features": [ids[idx] for idx in bins[b]],
+            "bbox": bbox,
+            "bytes": out["bytes"],
+            "sha1": out["hash"].hexdigest(),
+        })
+        print(f"Saved {out['file']} ({out['count']} features, {out['bytes'] / (1024 * 1024):.2f} MB)")
+
+    manifest = {"source": os.path.basename(input_file), "id_field": id_field, "chunks": chunks}
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
 
     print("Splitting complete.")
 
 if __name__ == "__main__":
     # Adjust paths based on the project structure
     # Script is in root, data is in ./data
-    INPUT_FILE = os.path.join("data", "sitios_prior_propuestos.json") 
+    INPUT_FILE = os.path.join("data", "sitios_prior_propuestos.json")
     OUTPUT_DIR = os.path.join("data", "chunks")
-    
+
     if os.path.exists(INPUT_FILE):
         split_geojson(INPUT_FILE, OUTPUT_DIR)
     else:
@@ -0,0 +1,282 @@
+"""
+Synthetic dataset generator for benchmark.py.
+
+Writes a data directory shaped like the real one at any multiple of its size:
+the Originals GeoJSON and attribute JSON (Codrnap), the unsplit Proposed
+GeoJSON (input of split_data.py) and attribute JSON (Name), and one KMZ per
+Macro Zona with the PopupInfo HTML descriptions. Sites are star-shaped
+MultiPolygons with a realistic spread of vertex counts; each proposed site is
+a perturbed copy of its original. Files are written one feature at a time, so
+large scales do not need the whole dataset in memory.
+
+Usage:
+    python synthetic_data.py <output_dir> [scale]
+"""
+import json
+import math
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+# 1x matches the current dataset: ~100 sites, median ~2700 vertices per site
+SITES_PER_SCALE = 100
+MEDIAN_VERTICES = 2700
+MAX_VERTICES = 70000
+
+# (name, KMZ file, latitude range) of each Macro Zona
+ZONES = [
+    ("Macro Zona Norte", "MacroZonaNorte.kmz", (-27.0, -18.0)),
+    ("Macro Zona Centro", "MacroZonaCentro.kmz", (-38.0, -27.0)),
+    ("Macro Zona Sur", "MacroZonaSur.kmz", (-53.0, -38.0)),
+]
+
+DESIGNATION = "Sitio Prioritario (Ley 19.300 art. 11, letra d)"
+
+# Same layout as the ArcGIS XSLT output found in the real KMZs
+POPUP_TEMPLATE = (
+    '<html xmlns:fo="http://www.w3.org/1999/XSL/Format" xmlns:msxsl="urn:schemas-microsoft-com:xslt">\n'
+    '<head>\n<META http-equiv="Content-Type" content="text/html">\n'
+    '<meta http-equiv="content-type" content="text/html; charset=UTF-8">\n</head>\n'
+    '<body style="margin:0px 0px 0px 0px;overflow:auto;background:#FFFFFF;">\n'
+    '<table style="font-family:Arial,Verdana,Times;font-size:12px;text-align:left;width:100%;'
+    'border-collapse:collapse;padding:3px 3px 3px 3px">\n'
+    '<tr style="text-align:center;font-weight:bold;background:#9CBCE2">\n<td>{title}</td>\n</tr>\n'
+    '<tr>\n<td>\n<table style="font-family:Arial,Verdana,Times;font-size:12px;text-align:left;width:100%;'
+    'border-spacing:0px; padding:3px 3px 3px 3px">\n{rows}</table>\n</td>\n</tr>\n</table>\n</body>\n</html>'
+)
+POPUP_ROW = '<tr{bg}>\n<td>{key}</td>\n<td>{value}</td>\n</tr>\n'
+
+
+def site_ids(n_sites):
+    """
+    Codrnap-style IDs: 'SP<zone>-<number>', zones numbered from 1.
+    """
+    width = max(3, len(str(n_sites)))
+    ids = []
+    for i in range(n_sites):
+        zone = i * len(ZONES) // n_sites
+        ids.append(f"SP{zone + 1}-{i + 1:0{width}d}")
+    return ids
+
+
+def star_polygon(rng, cx, cy, radius, n_vertices):
+    """
+    Closed ring (n x 2 array) of a random star-shaped polygon around (cx, cy).
+    Always simple, since angles are strictly increasing.
+    """
+    angles = np.sort(rng.uniform(0, 2 * np.pi, n_vertices))
+    # Smooth outline plus a little per-vertex noise
+    radii = radius * (1 + 0.25 * np.sin(angles * rng.integers(2, 7))
+                      + 0.1 * np.sin(angles * rng.integers(11, 31) + rng.uniform(0, 2 * np.pi))
+                      + rng.uniform(-0.005, 0.005, n_vertices))
+    ring = np.column_stack([cx + radii * np.cos(angles), cy + radii * np.sin(angles) * 0.9])
+    return np.vstack([ring, ring[:1]])
+
+
+def perturb(rng, ring, cx, cy, amount=0.08):
+    """
+    Proposed version of a ring: radially scaled by a smooth random factor.
+    """
+    angles = np.arctan2(ring[:-1, 1] - cy, ring[:-1, 0] - cx)
+    factor = 1 + amount * np.sin(angles * rng.integers(1, 4) + rng.uniform(0, 2 * np.pi))
+    moved = np.column_stack([cx + (ring[:-1, 0] - cx) * factor, cy + (ring[:-1, 1] - cy) * factor])
+    return np.vstack([moved, moved[:1]])
+
+
+def ring_metrics(ring, lat):
+    """
+    Approximate (hectares, km) of a lon/lat ring (equirectangular scale).
+    """
+    kx = 111.32 * math.cos(math.radians(lat))
+    ky = 110.57
+    x = ring[:, 0] * kx
+    y = ring[:, 1] * ky
+    area_km2 = 0.5 * abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+    perim_km = np.hypot(np.diff(x), np.diff(y)).sum()
+    return area_km2 * 100, perim_km
+
+
+def make_site(rng, lat_range):
+    """
+    Returns (original parts, proposed parts, latitude) of one site; each part
+    is a list with one ring.
+    """
+    n_total = int(np.clip(rng.lognormal(math.log(MEDIAN_VERTICES), 1.0), 16, MAX_VERTICES))
+    n_parts = int(rng.choice([1, 1, 2, 3]))
+    lat = rng.uniform(*lat_range)
+    lon = rng.uniform(-73.5, -68.5)
+    radius = rng.uniform(0.01, 0.15)
+
+    orig_parts = []
+    prop_parts = []
+    for p in range(n_parts):
+        # Parts side by side, far enough apart not to overlap
+        cx = lon + p * radius * 3
+        part_radius = radius / (p + 1)
+        ring = star_polygon(rng, cx, lat, part_radius, max(4, n_total // n_parts))
+        orig_parts.append([ring])
+        prop_parts.append([perturb(rng, ring, cx, lat)])
+    return orig_parts, prop_parts, lat
+
+
+def parts_metrics(parts, lat):
+    has = 0.0
+    perim = 0.0
+    for rings in parts:
+        h, p = ring_metrics(rings[0], lat)
+        has += h
+        perim += p
+    return round(has, 3), round(perim, 5)
+
+
+def geojson_geometry(parts):
+    return {
+        "type": "MultiPolygon",
+        "coordinates": [[np.round(ring, 8).tolist() for ring in rings] for rings in parts],
+    }
+
+
+def popup_html(site_id, name, zone, has, perim):
+    fields = [("Name", site_id), ("Nombre_SP", name), ("Macro_Zona", zone), ("Has", has), ("Perim_km", perim)]
+    rows = ''.join(
+        POPUP_ROW.format(bg=' bgcolor="#D4E4F3"' if i % 2 else '', key=k, value=v)
+        for i, (k, v) in enumerate(fields)
+    )
+    return POPUP_TEMPLATE.format(title=name, rows=rows)
+
+
+def kml_coordinates(ring):
+    return ('%.14f,%.14f,0 ' * len(ring) % tuple(ring.ravel())).rstrip()
+
+
+class _FeatureWriter:
+    """
+    Writes a GeoJSON FeatureCollection one feature at a time.
+    """
+
+    def __init__(self, path):
+        self.f = open(path, 'w', encoding='utf-8')
+        self.f.write('{"type": "FeatureCollection", "crs": {"type": "name", "properties": '
+                     '{"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}}, "features": [\n')
+        self.count = 0
+
+    def write(self, properties, geometry):
+        if self.count:
+            self.f.write(',\n')
+        # json.dumps (unlike json.dump) uses the C encoder
+        self.f.write(json.dumps({"type": "Feature", "properties": properties, "geometry": geometry},
+                                ensure_ascii=False))
+        self.count += 1
+
+    def close(self):
+        self.f.write('\n]}\n')
+        self.f.close()
+
+
+class _KmlWriter:
+    """
+    Writes a single-folder KMZ one Placemark at a time.
+    """
+
+    def __init__(self, path, name):
+        self.zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.f = self.zip.open('doc.kml', 'w')
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+            f'<Document id="{name}">\n  <name>{name}</name>\n  <Folder>\n    <name>{name}</name>\n'
+        )
+
+    def _write(self, text):
+        self.f.write(text.encode('utf-8'))
+
+    def write(self, name, description, parts):
+        polygons = ''.join(
+            '        <Polygon><outerBoundaryIs><LinearRing><coordinates> '
+            f'{kml_coordinates(rings[0])}</coordinates></LinearRing></outerBoundaryIs></Polygon>\n'
+            for rings in parts
+        )
+        self._write(
+            f'    <Placemark>\n      <name>{name}</name>\n'
+            f'      <description><![CDATA[{description}]]></description>\n'
+            f'      <MultiGeometry>\n{polygons}      </MultiGeometry>\n    </Placemark>\n'
+        )
+
+    def close(self):
+        self._write('  </Folder>\n</Document>\n</kml>\n')
+        self.f.close()
+        self.zip.close()
+
+
+def generate_dataset(output_dir, scale=1, seed=0):
+    """
+    Writes a synthetic data directory with scale * SITES_PER_SCALE sites.
+    Returns {"sites": n, "bytes": total bytes written}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_sites = int(round(scale * SITES_PER_SCALE))
+    ids = site_ids(n_sites)
+
+    orig_geo = _FeatureWriter(os.path.join(output_dir, "sitios_prior_originales.json"))
+    prop_geo = _FeatureWriter(os.path.join(output_dir, "sitios_prior_propuestos.json"))
+    kmz = [_KmlWriter(os.path.join(output_dir, kmz_file), name.replace(' ', '_'))
+           for name, kmz_file, _ in ZONES]
+    orig_attr = []
+    prop_attr = []
+
+    try:
+        for i, site_id in enumerate(ids):
+            zone = i * len(ZONES) // n_sites
+            zone_name, _, lat_range = ZONES[zone]
+            name = f"Sitio sintético {i + 1}"
+            orig_parts, prop_parts, lat = make_site(rng, lat_range)
+            has_o, perim_o = parts_metrics(orig_parts, lat)
+            has_p, perim_p = parts_metrics(prop_parts, lat)
+            popup = popup_html(site_id, name, zone_name, has_p, perim_p)
+
+            orig_geo.write({"Codrnap": site_id}, geojson_geometry(orig_parts))
+            orig_attr.append({
+                "URL_SIMBIO": f"https://simbio.mma.gob.cl/CbaSP/Details/{1000 + i}",
+                "Codrnap": site_id,
+                "NombreOrig": name,
+                "IdDesignac": 1000 + i,
+                "designacio": DESIGNATION,
+                "Has": has_o,
+                "Perim_km": perim_o,
+            })
+
+            prop_geo.write({"Name": site_id, "FolderPath": zone_name, "PopupInfo": None,
+                            "Has": has_p, "Perim_km": perim_p}, geojson_geometry(prop_parts))
+            prop_attr.append({"Name": site_id, "FolderPath": zone_name, "PopupInfo": popup,
+                              "Has": has_p, "Perim_km": perim_p})
+
+            kmz[zone].write(site_id, popup, prop_parts)
+    finally:
+        orig_geo.close()
+        prop_geo.close()
+        for writer in kmz:
+            writer.close()
+
+    for filename, records in (("sitios_prior_originales (1).json", orig_attr),
+                              ("sitios_prior_propuestos (1).json", prop_attr)):
+        with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+
+    total = sum(
+        os.path.getsize(os.path.join(output_dir, name))
+        for name in os.listdir(output_dir)
+        if os.path.isfile(os.path.join(output_dir, name))
+    )
+    return {"sites": n_sites, "bytes": total}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python synthetic_data.py <output_dir> [scale]")
+        sys.exit(1)
+    scale = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+    result = generate_dataset(sys.argv[1], scale)
+    print(f"{result['sites']} sites written to {sys.argv[1]} ({result['bytes'] / (1024 * 1024):.1f} MB)")
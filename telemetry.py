@@ -0,0 +1,129 @@
+"""
+Lightweight timing and size spans for the app's hot paths.
+
+span() times a block and records its duration plus optional fields, 'bytes'
+being the payload size. Every span is written as one JSON line to the
+"monitor.spans" logger and kept in a bounded per-stage window shared by all
+sessions of the process; summary() reduces the windows to p50/p95 for the
+admin panel in app.py.
+
+Where the JSON lines go is set with the SPAN_LOG environment variable:
+unset for stderr, a file path to append to that file, or "off".
+"""
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+# Spans kept per stage for the percentiles
+WINDOW = 500
+
+SPAN_LOG = os.environ.get("SPAN_LOG", "")
+
+logger = logging.getLogger("monitor.spans")
+
+_lock = threading.Lock()
+_windows = defaultdict(lambda: deque(maxlen=WINDOW))
+
+
+def _configure_logger():
+    if logger.handlers:
+        return
+    logger.propagate = False
+    if SPAN_LOG == "off":
+        logger.disabled = True
+        return
+    handler = logging.FileHandler(SPAN_LOG, encoding='utf-8') if SPAN_LOG else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+_configure_logger()
+
+
+class Span:
+    """
+    Context manager returned by span(). Fields can be added while the block
+    runs with set(), e.g. the size of what was produced.
+    """
+    __slots__ = ('stage', 'fields', '_start')
+
+    def __init__(self, stage, fields):
+        self.stage = stage
+        self.fields = fields
+        self._start = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        record(self.stage, (time.perf_counter() - self._start) * 1000, **self.fields)
+        return False
+
+
+def span(stage, **fields):
+    """
+    Times a `with` block as a span of the given stage.
+    """
+    return Span(stage, fields)
+
+
+def record(stage, ms, **fields):
+    """
+    Records an already measured span and logs it as JSON.
+    """
+    size = fields.get('bytes')
+    with _lock:
+        _windows[stage].append((ms, size))
+    if logger.isEnabledFor(logging.INFO):
+        entry = {"ts": round(time.time(), 3), "stage": stage, "ms": round(ms, 2)}
+        entry.update(fields)
+        logger.info(json.dumps(entry, default=str, ensure_ascii=False))
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile (q in 0..100) of a non-empty list.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summary():
+    """
+    One dict per stage: count, p50/p95 of the duration (ms) and of the
+    payload size (bytes, None for stages without sizes).
+    """
+    with _lock:
+        windows = {stage: list(spans) for stage, spans in _windows.items()}
+
+    rows = []
+    for stage in sorted(windows):
+        spans = windows[stage]
+        durations = [ms for ms, _ in spans]
+        sizes = [size for _, size in spans if size is not None]
+        rows.append({
+            "stage": stage,
+            "count": len(spans),
+            "p50_ms": round(percentile(durations, 50), 1),
+            "p95_ms": round(percentile(durations, 95), 1),
+            "p50_bytes": percentile(sizes, 50) if sizes else None,
+            "p95_bytes": percentile(sizes, 95) if sizes else None,
+        })
+    return rows
+
+
+def reset():
+    with _lock:
+        _windows.clear()
@@ -0,0 +1,84 @@
+"""
+Tests for the batch comparison metrics (compare_sites.py), on known pairs
+given directly in the comparison CRS.
+
+Run with:
+    python -m pytest test_compare_sites.py
+"""
+import math
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+import compare_sites
+
+CRS = compare_sites.COMPARE_CRS
+
+SQUARE = shapely.box(0, 0, 1000, 1000)
+# 10 m wide, 40 m deep notch in the middle of the bottom edge
+NOTCHED = shapely.Polygon([(0, 0), (495, 0), (495, 40), (505, 40), (505, 0), (1000, 0),
+                           (1000, 1000), (0, 1000)])
+HOLED = shapely.Polygon(SQUARE.exterior, [[(300, 300), (700, 300), (700, 700), (300, 700)]])
+
+
+def frames(pairs):
+    orig = gpd.GeoDataFrame({'Codrnap': [f"S{i}" for i in range(len(pairs))]},
+                            geometry=[a for a, _ in pairs], crs=CRS)
+    prop = gpd.GeoDataFrame({'Name': [f"S{i}" for i in range(len(pairs))]},
+                            geometry=[b for _, b in pairs], crs=CRS)
+    return orig, prop
+
+
+def test_hausdorff_known_pairs():
+    a = [SQUARE, SQUARE, SQUARE, SQUARE, SQUARE, None]
+    b = [SQUARE, shapely.affinity.translate(SQUARE, 30, 0), NOTCHED, HOLED,
+         shapely.Polygon(), SQUARE]
+    distances = compare_sites.hausdorff_distances(a, b)
+    steps = compare_sites._hausdorff_steps(np.array(a, dtype=object), np.array(b, dtype=object))
+    assert distances[0] == 0
+    assert distances[1] == pytest.approx(30, abs=1.5 * steps[1])
+    assert distances[2] == pytest.approx(40, abs=1.5 * steps[2])
+    # The hole's ring is 300 m from the outer boundary
+    assert distances[3] == pytest.approx(300, abs=1e-6)
+    assert np.isnan(distances[4]) and np.isnan(distances[5])
+
+
+def test_hausdorff_is_symmetric_and_within_step():
+    # Exact value from GEOS with heavy densification
+    a = np.array([SQUARE, shapely.affinity.rotate(SQUARE, 10)], dtype=object)
+    b = np.array([shapely.affinity.scale(SQUARE, 1.1, 0.9), NOTCHED], dtype=object)
+    exact = shapely.hausdorff_distance(a, b, densify=0.001)
+    steps = compare_sites._hausdorff_steps(a, b)
+    assert np.all(np.abs(compare_sites.hausdorff_distances(a, b) - exact) <= 1.5 * steps)
+    np.testing.assert_array_equal(compare_sites.hausdorff_distances(a, b), compare_sites.hausdorff_distances(b, a))
+
+
+def test_compare_sites_metrics():
+    shifted = shapely.affinity.translate(SQUARE, 500, 0)
+    comparison = compare_sites.compare_sites(*frames([(SQUARE, SQUARE), (SQUARE, shifted), (SQUARE, None)]))
+    assert list(comparison.columns) == compare_sites.COLUMNS
+    same, half, missing = comparison.to_dict('records')
+
+    assert same['area_orig_ha'] == pytest.approx(100)
+    assert same['iou'] == pytest.approx(1)
+    assert same['symdiff_ha'] == pytest.approx(0)
+    assert same['hausdorff_m'] == 0
+
+    assert half['inter_ha'] == pytest.approx(50)
+    assert half['symdiff_ha'] == pytest.approx(100)
+    assert half['iou'] == pytest.approx(1 / 3)
+    assert half['hausdorff_m'] == pytest.approx(500, abs=1.5 * math.hypot(1500, 1000) * compare_sites.HAUSDORFF_RESOLUTION)
+
+    assert missing['area_orig_ha'] == pytest.approx(100)
+    assert np.isnan(missing['iou']) and np.isnan(missing['hausdorff_m'])
+
+
+def test_match_sites_links_overlaps():
+    orig, prop = frames([(SQUARE, shapely.affinity.translate(SQUARE, 250, 0)),
+                         (shapely.affinity.translate(SQUARE, 5000, 0), shapely.box(999.5, 0, 2000, 1000))])
+    matches = compare_sites.match_sites(orig, prop)
+    # S0 overlaps S0 by 75%; the 0.5 m sliver with S1 is below MIN_MATCH_SHARE
+    assert matches[['Codrnap', 'Name']].values.tolist() == [['S0', 'S0']]
+    assert matches['share_orig'].iloc[0] == pytest.approx(0.75)
@@ -0,0 +1,39 @@
+"""
+Tests for the Ficha derivative cache (fichas.py).
+
+Run with:
+    python -m pytest test_fichas.py
+"""
+import os
+
+from PIL import Image
+
+import fichas
+
+
+def write_jpeg(path, color):
+    Image.new('RGB', (64, 48), color).save(path, 'JPEG')
+
+
+def test_ficha_image_hashes_source_once(tmp_path, monkeypatch):
+    fichas_dir, cache_dir = str(tmp_path / "Fichas"), str(tmp_path / "cache")
+    os.makedirs(fichas_dir)
+    source = os.path.join(fichas_dir, "SP-1.jpg")
+    write_jpeg(source, 'red')
+
+    hashed = []
+    file_sha1 = fichas.file_sha1
+    monkeypatch.setattr(fichas, "file_sha1", lambda path: hashed.append(path) or file_sha1(path))
+    first = fichas.ficha_image("SP-1", "thumb", fichas_dir, cache_dir)
+    assert fichas.ficha_image("SP-1", "thumb", fichas_dir, cache_dir) == first
+    assert fichas.ficha_image("SP-1", "screen", fichas_dir, cache_dir) != first
+    assert hashed == [source]
+
+    # A replaced JPEG is hashed again and gets a new derivative
+    write_jpeg(source, 'blue')
+    os.utime(source, ns=(0, os.stat(source).st_mtime_ns + 1))
+    replaced = fichas.ficha_image("SP-1", "thumb", fichas_dir, cache_dir)
+    assert replaced != first
+    assert hashed == [source, source]
+    with Image.open(replaced) as im:
+        assert im.getpixel((0, 0))[2] > 200
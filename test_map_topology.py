@@ -0,0 +1,114 @@
+"""
+Round-trip tests for the map layer encoding (map_topology.py), decoded with
+a Python port of DECODER_JS.
+
+Run with:
+    python -m pytest test_map_topology.py
+"""
+import json
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+import map_topology
+
+
+def decode(text):
+    # Same steps as DECODER_JS: {layer name: [(properties, MultiPolygon)]}
+    topo = json.loads(text)
+    scale, (tx, ty) = topo["scale"], topo["translate"]
+    arcs = []
+    for flat in topo["arcs"]:
+        xy = np.cumsum(np.reshape(flat, (-1, 2)), axis=0)
+        arcs.append([(x * scale + tx, y * scale + ty) for x, y in xy])
+
+    def ring(refs):
+        out = []
+        for r in refs:
+            points = arcs[~r][::-1] if r < 0 else arcs[r]
+            out += points[1:] if out else points
+        return out
+
+    return {
+        name: [(f["p"], shapely.MultiPolygon([(ring(p[0]), [ring(h) for h in p[1:]]) for p in f["g"]]))
+               for f in features]
+        for name, features in topo["objects"].items()
+    }
+
+
+def layer(geometries, **columns):
+    return gpd.GeoDataFrame(columns, geometry=geometries, crs="EPSG:4326")
+
+
+def assert_same_shape(decoded, geometry):
+    assert shapely.equals_exact(shapely.normalize(decoded), shapely.normalize(shapely.MultiPolygon(
+        shapely.get_parts(geometry))), tolerance=map_topology.QUANTUM)
+
+
+LEFT = shapely.box(-70.5, -33.5, -70.4, -33.4)
+RIGHT = shapely.box(-70.4, -33.5, -70.3, -33.4)
+
+
+def test_shared_edge_is_stored_once():
+    text = map_topology.encode_layers({
+        "orig": (layer([LEFT], Codrnap=["A"]), ["Codrnap"]),
+        "prop": (layer([RIGHT], Name=["B"]), ["Name"]),
+    })
+    topo = json.loads(text)
+    # The common edge, plus the rest of each boundary
+    assert len(topo["arcs"]) == 3
+    refs = [r for name in ("orig", "prop") for r in topo["objects"][name][0]["g"][0][0]]
+    shared = [r for r in refs if refs.count(r) + refs.count(~r) == 2]
+    assert len(shared) == 2 and shared[0] == ~shared[1]
+
+    decoded = decode(text)
+    assert decoded["orig"][0][0] == {"Codrnap": "A"}
+    assert decoded["prop"][0][0] == {"Name": "B"}
+    assert_same_shape(decoded["orig"][0][1], LEFT)
+    assert_same_shape(decoded["prop"][0][1], RIGHT)
+
+
+def test_identical_reversed_ring_is_one_arc():
+    # The same boundary in both layers, digitized from another vertex and
+    # in the opposite direction
+    coords = list(LEFT.exterior.coords)[:-1]
+    reversed_ring = shapely.Polygon((coords[2:] + coords[:2])[::-1])
+    topo = json.loads(map_topology.encode_layers({
+        "orig": (layer([LEFT]), []),
+        "prop": (layer([reversed_ring]), []),
+    }))
+    assert len(topo["arcs"]) == 1
+    orig_ref, = topo["objects"]["orig"][0]["g"][0][0]
+    prop_ref, = topo["objects"]["prop"][0]["g"][0][0]
+    assert {orig_ref, prop_ref} == {0, ~0}
+
+    decoded = decode(json.dumps(topo))
+    assert_same_shape(decoded["orig"][0][1], LEFT)
+    assert_same_shape(decoded["prop"][0][1], reversed_ring)
+
+
+def test_holes_and_multipolygons_round_trip():
+    holed = shapely.Polygon(shapely.box(-71, -34, -70, -33).exterior.coords,
+                            [shapely.box(-70.8, -33.8, -70.6, -33.6).exterior.coords,
+                             shapely.box(-70.4, -33.4, -70.2, -33.2).exterior.coords])
+    # An island inside the first hole, touching nothing
+    multi = shapely.MultiPolygon([holed, shapely.box(-70.75, -33.75, -70.65, -33.65)])
+    # Shares the first hole's boundary as its own exterior
+    filler = shapely.box(-70.8, -33.8, -70.6, -33.6).difference(shapely.box(-70.75, -33.75, -70.65, -33.65))
+    frames = {
+        "orig": (layer([multi, None], Codrnap=["A", "B"], area=[1.5, np.nan]), ["Codrnap", "area"]),
+        "prop": (layer([filler], Name=["C"]), ["Name", "missing"]),
+    }
+    decoded = decode(map_topology.encode_layers(frames))
+
+    (props_a, geom_a), (props_b, geom_b) = decoded["orig"]
+    assert props_a == {"Codrnap": "A", "area": 1.5}
+    assert props_b == {"Codrnap": "B", "area": None}
+    assert geom_b.is_empty
+    assert_same_shape(geom_a, multi)
+    assert len(geom_a.geoms) == 2 and len(geom_a.geoms[0].interiors) == 2
+
+    (props_c, geom_c), = decoded["prop"]
+    assert props_c == {"Name": "C"}
+    assert_same_shape(geom_c, filler)
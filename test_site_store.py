@@ -0,0 +1,126 @@
+"""
+Regression tests for the incremental store refresh: patching a changed chunk
+or KMZ into the store must give the same data as a full build_store.
+
+Run with:
+    python -m pytest test_site_store.py
+"""
+import json
+import os
+import shutil
+import zipfile
+
+import pandas as pd
+import pytest
+
+import site_store
+import split_data
+import synthetic_data
+
+# 6 sites, split into several chunks
+SCALE = 0.06
+CHUNK_MB = 0.1
+
+
+@pytest.fixture(scope="module")
+def built_dir(tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp("data"))
+    synthetic_data.generate_dataset(data_dir, SCALE, seed=0)
+    split_data.split_geojson(os.path.join(data_dir, "sitios_prior_propuestos.json"),
+                             os.path.join(data_dir, "chunks"), max_size_mb=CHUNK_MB)
+    assert site_store.build_store(data_dir)
+    return data_dir
+
+
+@pytest.fixture
+def data_dir(built_dir, tmp_path):
+    path = str(tmp_path / "data")
+    shutil.copytree(built_dir, path)
+    return path
+
+
+def store_contents(data_dir):
+    # Everything the app reads from the store, without the blob offsets
+    # (a refresh appends to the blobs, a full build writes them compactly)
+    df_orig, df_prop = site_store.read_store(data_dir)
+    offsets = [c for c in site_store.INDEX_COLUMNS if c not in site_store.BBOX_COLUMNS]
+    contents = {}
+    for kind, df in (("orig", df_orig), ("prop", df_prop)):
+        contents[kind] = df.drop(columns=[c for c in offsets if c in df.columns]).reset_index(drop=True)
+        for level in site_store.PYRAMID_LEVELS:
+            site = site_store.site_geometry(df, kind, data_dir, level=level)
+            contents[f"{kind}_L{level}"] = list(site.geometry.to_wkb())
+    contents["popup"] = [site_store.popup_info(row, data_dir) for _, row in df_prop.iterrows()]
+    contents["comparison"] = site_store.read_comparison(data_dir).sort_values("Codrnap", ignore_index=True)
+    contents["matches"] = site_store.read_matches(data_dir).sort_values(["Codrnap", "Name"], ignore_index=True)
+    return contents
+
+
+def assert_same_as_full_build(data_dir, tmp_path):
+    full_dir = str(tmp_path / "full")
+    shutil.copytree(data_dir, full_dir)
+    shutil.rmtree(site_store.store_dir(full_dir))
+    assert site_store.build_store(full_dir)
+
+    refreshed = store_contents(data_dir)
+    full = store_contents(full_dir)
+    assert refreshed.keys() == full.keys()
+    for key, value in full.items():
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(refreshed[key], value, check_dtype=False)
+        else:
+            assert refreshed[key] == value, key
+
+
+def test_refresh_patches_changed_chunk(data_dir, tmp_path, capsys):
+    chunk = site_store.chunk_files(data_dir)[0]
+    with open(chunk, encoding='utf-8') as f:
+        collection = json.load(f)
+    # Move the first site's geometry, which changes its comparison metrics
+    geometry = collection["features"][0]["geometry"]
+    geometry["coordinates"] = [
+        [[[x + 0.01, y] for x, y in ring] for ring in polygon] for polygon in geometry["coordinates"]
+    ]
+    with open(chunk, 'w', encoding='utf-8') as f:
+        json.dump(collection, f)
+
+    capsys.readouterr()
+    assert site_store.refresh_store(data_dir)
+    assert "Store refreshed" in capsys.readouterr().out
+    assert site_store.is_store_fresh(data_dir)
+    assert_same_as_full_build(data_dir, tmp_path)
+
+
+def test_refresh_patches_changed_kmz(data_dir, tmp_path, capsys):
+    kmz = os.path.join(data_dir, synthetic_data.ZONES[0][1])
+    with zipfile.ZipFile(kmz) as z:
+        kml = z.read('doc.kml').decode('utf-8')
+    assert "Sitio sintético 1<" in kml
+    with zipfile.ZipFile(kmz, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr('doc.kml', kml.replace("Sitio sintético 1<", "Sitio renombrado 1<"))
+
+    capsys.readouterr()
+    assert site_store.refresh_store(data_dir)
+    assert "Store refreshed" in capsys.readouterr().out
+    assert any("Sitio renombrado 1<" in (popup or "") for popup in store_contents(data_dir)["popup"])
+    assert_same_as_full_build(data_dir, tmp_path)
+
+
+def test_full_build_keeps_blobs_of_loaded_frames(data_dir):
+    before = site_store.load_site_data(data_dir)
+    rows = before.prop.iloc[:3]
+    geometries = list(site_store.site_geometry(rows, 'prop', data_dir).geometry.to_wkb())
+    popups = [site_store.popup_info(row, data_dir) for _, row in rows.iterrows()]
+    generation = site_store.read_meta(data_dir)["generation"]
+
+    # Rows loaded before the build keep reading the blobs their offsets point into
+    assert site_store.build_store(data_dir)
+    assert site_store.read_meta(data_dir)["generation"] == generation + 1
+    assert list(site_store.site_geometry(rows, 'prop', data_dir).geometry.to_wkb()) == geometries
+    assert [site_store.popup_info(row, data_dir) for _, row in rows.iterrows()] == popups
+
+    # Only the current and previous generations are kept
+    assert site_store.build_store(data_dir)
+    names = os.listdir(site_store.store_dir(data_dir))
+    assert not any(f"_g{generation}." in name for name in names)
+    assert any(f"_g{generation + 2}." in name for name in names)
@@ -0,0 +1,135 @@
+"""
+Tests for the streaming chunk splitter (split_data.py) and the chunk
+selection it enables in site_store.
+
+Run with:
+    python -m pytest test_split_data.py
+"""
+import json
+import os
+
+import pytest
+
+import site_store
+import split_data
+import synthetic_data
+
+
+def write_collection(path, features, **members):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"type": "FeatureCollection", **members, "features": features}, f)
+
+
+def square(name, x, y, size=1.0):
+    ring = [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+    return {"type": "Feature", "properties": {"Name": name},
+            "geometry": {"type": "Polygon", "coordinates": [ring]}}
+
+
+def test_iter_geojson_round_trip(tmp_path):
+    path = str(tmp_path / "in.json")
+    features = [square(f"S{i}", i, -i, 0.5 + i) for i in range(5)]
+    crs = {"type": "name", "properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}}
+    # Members after the features array are picked up too
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        f.write(',\n'.join(json.dumps(feature) for feature in features))
+        f.write('\n], "crs": ' + json.dumps(crs) + '}')
+
+    members = {}
+    streamed = list(split_data.iter_geojson(path, members))
+    assert [feature for feature, _, _ in streamed] == features
+    assert [json.loads(raw) for _, raw, _ in streamed] == features
+    assert members == {"type": "FeatureCollection", "crs": crs}
+
+    # The spans point at each feature's raw text in the file
+    spans = [span for _, _, span in streamed]
+    assert list(split_data.read_spans(path, spans, block_size=7)) == [raw for _, raw, _ in streamed]
+
+
+def test_iter_geojson_small_blocks(tmp_path):
+    # Values split across read blocks (numbers included) parse the same
+    path = str(tmp_path / "in.json")
+    features = [square(f"S{i}", 123.456789 * i, -98.7654321, 1e-7 + i) for i in range(20)]
+    write_collection(path, features)
+    with open(path, encoding='utf-8') as f:
+        stream = split_data._JsonStream(f, block_size=3)
+        assert json.loads(json.dumps(stream.value())) == {"type": "FeatureCollection", "features": features}
+
+
+def test_pack_features():
+    sizes = [70, 10, 50, 40, 30, 120, 20]
+    bins = split_data.pack_features(sizes, 100)
+    # Every feature in exactly one bin, bins in input order and under capacity
+    assert sorted(i for b in bins for i in b) == list(range(len(sizes)))
+    assert all(b == sorted(b) for b in bins)
+    for b in bins:
+        assert len(b) == 1 or sum(sizes[i] for i in b) <= 100
+    # The oversized feature is alone, and first-fit decreasing needs 4 bins here
+    assert [5] in bins
+    assert len(bins) == 4
+
+
+def test_split_geojson_manifest(tmp_path):
+    path = str(tmp_path / "in.json")
+    features = [square(f"S{i}", i * 10, 0) for i in range(12)]
+    write_collection(path, features)
+    out_dir = str(tmp_path / "chunks")
+    split_data.split_geojson(path, out_dir, max_size_mb=600 / (1024 * 1024))
+
+    with open(os.path.join(out_dir, split_data.MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert len(manifest["chunks"]) > 1
+    seen = []
+    for chunk in manifest["chunks"]:
+        with open(os.path.join(out_dir, chunk["file"]), encoding='utf-8') as f:
+            written = json.load(f)["features"]
+        assert [feature["properties"]["Name"] for feature in written] == chunk["features"]
+        assert chunk["bytes"] == os.path.getsize(os.path.join(out_dir, chunk["file"]))
+        xs = [x for feature in written for x, _ in feature["geometry"]["coordinates"][0]]
+        assert chunk["bbox"] == [min(xs), 0, max(xs), 1]
+        seen += written
+    assert sorted(seen, key=lambda f: f["properties"]["Name"]) == sorted(features, key=lambda f: f["properties"]["Name"])
+
+
+@pytest.fixture
+def chunked_dir(tmp_path):
+    data_dir = str(tmp_path)
+    synthetic_data.generate_dataset(data_dir, 0.06, seed=0)
+    split_data.split_geojson(os.path.join(data_dir, "sitios_prior_propuestos.json"),
+                             os.path.join(data_dir, "chunks"), max_size_mb=0.1)
+    return data_dir
+
+
+def test_query_opens_only_matching_chunks(chunked_dir, monkeypatch):
+    opened = []
+    read_chunk = site_store.read_chunk
+    monkeypatch.setattr(site_store, "read_chunk", lambda path: opened.append(path) or read_chunk(path))
+
+    manifest = site_store.read_chunk_manifest(chunked_dir)
+    chunks = [c for c in manifest["chunks"] if c["features"]]
+    assert len(chunks) > 2
+    target = chunks[1]
+    expected = [os.path.join(chunked_dir, "chunks", target["file"])]
+
+    # By ID
+    frame = site_store.query_chunks(chunked_dir, ids=[target["features"][0]])
+    assert opened == expected
+    assert list(frame['Name']) == [target["features"][0]]
+
+    # By bounds: a point inside the chunk's bbox that no other chunk's bbox covers
+    opened.clear()
+    minx, miny, maxx, maxy = target["bbox"]
+    others = [c["bbox"] for c in chunks if c is not target]
+    point = next(
+        (x, y)
+        for x in (minx, (minx + maxx) / 2, maxx) for y in (miny, (miny + maxy) / 2, maxy)
+        if not any(b[0] <= x <= b[2] and b[1] <= y <= b[3] for b in others)
+    )
+    site_store.query_chunks(chunked_dir, bounds=(*point, *point))
+    assert opened == expected
+
+    # Nowhere near any site
+    opened.clear()
+    assert site_store.query_chunks(chunked_dir, bounds=(0, 0, 1, 1)).empty
+    assert opened == []
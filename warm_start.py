@@ -0,0 +1,104 @@
+"""
+Cold-start helpers for app.py, using the standard library only.
+
+The warm-state snapshot is a small JSON written next to the store by
+site_store (selection list, site IDs and headline metrics), so the page shell
+and the site selectbox can be rendered before pandas, geopandas or folium are
+even imported. Those heavy imports run meanwhile in a background thread
+(preload), and the rest of the page picks them up once they are ready.
+"""
+import hashlib
+import importlib
+import json
+import os
+import threading
+
+DATA_DIR = "data"
+STORE_DIRNAME = "store"
+SNAPSHOT_FILE = "snapshot.json"
+
+_preload_lock = threading.Lock()
+_preload_started = set()
+
+
+def snapshot_path(data_dir=DATA_DIR):
+    return os.path.join(data_dir, STORE_DIRNAME, SNAPSHOT_FILE)
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def store_stamp(names, data_dir=DATA_DIR):
+    """
+    {file: [size, mtime_ns]} of the given store files.
+    """
+    stamp = {}
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(data_dir, STORE_DIRNAME, name))
+        except OSError:
+            continue
+        stamp[name] = [stat.st_size, stat.st_mtime_ns]
+    return stamp
+
+
+def write_snapshot(options, option_ids, metrics, store_files, data_dir=DATA_DIR):
+    """
+    Writes the snapshot: the selectbox options (in display order), the
+    option -> site ID mapping and {site ID: {metric: value}}. It stays valid
+    while the store_files it was derived from are unchanged, so it must be
+    written after them.
+    """
+    snapshot = {
+        "store": store_stamp(store_files, data_dir),
+        "options": list(options),
+        "ids": option_ids,
+        "metrics": metrics,
+    }
+    path = snapshot_path(data_dir)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def read_snapshot(data_dir=DATA_DIR):
+    """
+    Returns the snapshot dict, or None if there is none or the store changed
+    since it was written.
+    """
+    try:
+        with open(snapshot_path(data_dir), 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stamp = snapshot.get("store") or {}
+    if not snapshot.get("options") or stamp != store_stamp(stamp, data_dir):
+        return None
+    return snapshot
+
+
+def _import_all(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            # The import is retried (and fails visibly) where it is needed
+            pass
+
+
+def preload(modules):
+    """
+    Imports the given modules in a background thread, once per process.
+    A later regular import of a module still being loaded simply waits for it.
+    """
+    with _preload_lock:
+        modules = [m for m in modules if m not in _preload_started]
+        _preload_started.update(modules)
+    if modules:
+        threading.Thread(target=_import_all, args=(modules,), daemon=True).start()